@@ -0,0 +1,120 @@
+#!/Library/Frameworks/Python.framework/Versions/3.12/bin/python3
+
+import os
+import glob
+import argparse
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from topic_subscriber import ProcessingContext
+from data_processor import collect_run
+from run_store import RunStore
+
+json_map = 'json_maps/testrow.json'
+output_file = 'batch_results.csv'
+
+def find_bags(pattern):
+    # Accept either a directory of bags or a glob pattern
+    if os.path.isdir(pattern):
+        pattern = os.path.join(pattern, '*.bag')
+    return sorted(glob.glob(pattern))
+
+def find_map(bag_path, default_map, map_dir=None):
+    # A map named after the bag in map_dir wins over the default map
+    if map_dir:
+        candidate = os.path.join(map_dir, os.path.splitext(os.path.basename(bag_path))[0] + '.json')
+        if os.path.exists(candidate):
+            return candidate
+    return default_map
+
+def run_in_pool(function, jobs, workers=None):
+    # Runs function(*args) for every key: args in jobs in worker processes and yields
+    # (key, result, error) as each one finishes. A worker that dies (e.g. a crash inside the bag
+    # reader) breaks the whole pool, so the unfinished jobs are resubmitted to a fresh pool.
+    # When a pool breaks before finishing anything, the next job is run on its own to find the
+    # one that crashes, so every job ends with a result or an error.
+    pending = dict(jobs)
+    alone = False
+    while pending:
+        batch = dict([next(iter(pending.items()))]) if alone else pending
+        progress = False
+        with ProcessPoolExecutor(max_workers=1 if alone else workers) as executor:
+            futures = {executor.submit(function, *args): key for key, args in batch.items()}
+            for future in as_completed(futures):
+                key = futures[future]
+                try:
+                    result, error = future.result(), None
+                except BrokenProcessPool as e:
+                    if not alone:
+                        continue
+                    result, error = None, e
+                except Exception as e:
+                    result, error = None, e
+                del pending[key]
+                progress = True
+                yield key, result, error
+        alone = not progress
+
+def process_bag(bag_path, json_file_path, details=False):
+    # Runs in a worker process; any failure is reported in the row instead of raised.
+    # With details, the PLC segments and stop events come back too (for the run store).
+    try:
+        run = collect_run(ProcessingContext(bag_path, json_file_path))
+        summary = run['summary']
+        summary['error'] = None
+        if details:
+            summary['segment_table'] = run['segments']
+            summary['stop_table'] = run['stops']
+    except Exception as e:
+        summary = {'bag_path': bag_path, 'json_map': json_file_path, 'error': f"{type(e).__name__}: {e}"}
+    return summary
+
+def run_batch(bag_paths, default_map=json_map, map_dir=None, workers=None, output_file=output_file, store_file=None):
+    results = []
+    # Workers only compute; the parent is the single writer to the store
+    store = RunStore(store_file) if store_file else None
+
+    jobs = {bag: (bag, find_map(bag, default_map, map_dir), store is not None) for bag in bag_paths}
+    for bag, result, error in run_in_pool(process_bag, jobs, workers):
+        if error is not None:
+            # The worker itself died, so process_bag could not report the failure
+            result = {'bag_path': bag, 'json_map': find_map(bag, default_map, map_dir), 'error': f"{type(error).__name__}: {error}"}
+        status = 'failed' if result['error'] else 'done'
+        print(f"{status}: {bag}")
+        segments = result.pop('segment_table', None)
+        stops = result.pop('stop_table', None)
+        if store and not result['error']:
+            store.store_run(result, segments, stops)
+        results.append(result)
+
+    if store:
+        store.close()
+
+    results_df = pd.DataFrame(results)
+    if not results_df.empty:
+        results_df = results_df.sort_values('bag_path').reset_index(drop=True)
+    if output_file:
+        results_df.to_csv(output_file, index=False)
+    return results_df
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarise many bags in parallel.")
+    parser.add_argument('bags', help="directory of .bag files or a glob pattern")
+    parser.add_argument('--map', default=json_map, help="JSON map used for bags without their own map")
+    parser.add_argument('--map-dir', help="directory holding <bag name>.json maps")
+    parser.add_argument('--workers', type=int, help="number of worker processes (default: one per core)")
+    parser.add_argument('--output', default=output_file, help="CSV file for the combined results")
+    parser.add_argument('--store', help="SQLite run store to add the results to (see run_store.py)")
+    args = parser.parse_args()
+
+    bag_paths = find_bags(args.bags)
+    if not bag_paths:
+        print(f"No bags found for {args.bags}")
+        return
+
+    results_df = run_batch(bag_paths, args.map, args.map_dir, args.workers, args.output, args.store)
+    failed = results_df['error'].notna().sum()
+    print(f"Processed {len(results_df)} bags ({failed} failed). Results saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+#!/Library/Frameworks/Python.framework/Versions/3.12/bin/python3
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+class CrossTrackEngine:
+    # Signed cross-track error and along-track progress of positions against the planned path.
+    # Segments are cut into short buckets whose midpoints go in a cKDTree, and every position is checked
+    # against the segments of its k nearest buckets at once. Only positions whose nearest segment could lie
+    # outside that set are re-queried with a larger k, so the result is exact without a Python loop.
+
+    max_k = 128
+
+    def __init__(self, path_x, path_y):
+        path = np.column_stack((np.asarray(path_x, dtype=float), np.asarray(path_y, dtype=float)))
+        if len(path) < 2:
+            raise ValueError("The planned path needs at least two points.")
+
+        self.segment_start = path[:-1]
+        self.segment_vector = path[1:] - path[:-1]
+        self.segment_length = np.hypot(self.segment_vector[:, 0], self.segment_vector[:, 1])
+        self.cumulative_distance = np.concatenate(([0.0], np.cumsum(self.segment_length)))
+
+        # Long segments are split so no bucket is much longer than a typical segment. Duplicate points
+        # give zero-length segments: they would pull the median to zero and have no direction to sign
+        # the error with, so they are left out of the median and get no buckets of their own.
+        moving = self.segment_length > 0
+        bucket_length = 2 * np.median(self.segment_length[moving]) if moving.any() else 1.0
+        buckets_per_segment = np.maximum(np.ceil(self.segment_length / bucket_length), 1).astype(np.intp)
+        if moving.any():
+            buckets_per_segment[~moving] = 0
+        self.bucket_segment = np.repeat(np.arange(len(self.segment_length)), buckets_per_segment)
+        first_bucket = np.repeat(np.cumsum(buckets_per_segment) - buckets_per_segment, buckets_per_segment)
+        bucket_count = buckets_per_segment[self.bucket_segment]
+        bucket_middle = (np.arange(len(self.bucket_segment)) - first_bucket + 0.5) / bucket_count
+        self.max_half_length = (self.segment_length[self.bucket_segment] / bucket_count).max() / 2
+        self.bucket_tree = cKDTree(self.segment_start[self.bucket_segment] + bucket_middle[:, None] * self.segment_vector[self.bucket_segment])
+
+    def project(self, positions, segments):
+        # Distance from each position to each candidate segment and how far along it the closest point lies
+        start = self.segment_start[segments]
+        vector = self.segment_vector[segments]
+        length = self.segment_length[segments]
+        offset = positions[:, None, :] - start
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            fraction = (offset * vector).sum(axis=-1) / length**2
+        fraction = np.nan_to_num(fraction).clip(0, 1)
+
+        closest = start + fraction[..., None] * vector
+        distance = np.hypot(positions[:, None, 0] - closest[..., 0], positions[:, None, 1] - closest[..., 1])
+        return distance, fraction
+
+    def nearest_segments(self, positions, k):
+        k = min(k, len(self.bucket_segment))
+        midpoint_distance, buckets = self.bucket_tree.query(positions, k=k, workers=-1)
+        if k == 1:
+            midpoint_distance, buckets = midpoint_distance[:, None], buckets[:, None]
+        candidates = self.bucket_segment[buckets]
+
+        distance, fraction = self.project(positions, candidates)
+        best = distance.argmin(axis=1)
+        rows = np.arange(len(positions))
+        segment, best_distance, best_fraction = candidates[rows, best], distance[rows, best], fraction[rows, best]
+
+        # A bucket outside the candidate set is at least (k-th midpoint distance - half the longest bucket) away
+        unsure = (midpoint_distance[:, -1] - self.max_half_length < best_distance) & (k < len(self.bucket_segment))
+        if unsure.any():
+            if k < self.max_k:
+                segment[unsure], best_distance[unsure], best_fraction[unsure] = self.nearest_segments(positions[unsure], k * 4)
+            else:
+                segment[unsure], best_distance[unsure], best_fraction[unsure] = self.nearest_segments_within(positions[unsure], best_distance[unsure])
+
+        return segment, best_distance, best_fraction
+
+    def nearest_segments_within(self, positions, best_distance):
+        # Fallback for the few positions far from a densely sampled path: check every bucket that could
+        # still hold a closer segment, one position at a time
+        segment = np.empty(len(positions), dtype=np.intp)
+        distance = np.empty(len(positions))
+        fraction = np.empty(len(positions))
+        nearby = self.bucket_tree.query_ball_point(positions, best_distance + self.max_half_length, workers=-1)
+
+        for i, buckets in enumerate(nearby):
+            candidates = np.unique(self.bucket_segment[buckets])
+            candidate_distance, candidate_fraction = self.project(positions[i:i + 1], candidates[None, :])
+            best = candidate_distance[0].argmin()
+            segment[i], distance[i], fraction[i] = candidates[best], candidate_distance[0, best], candidate_fraction[0, best]
+
+        return segment, distance, fraction
+
+    def query(self, x, y, k=8, chunk_size=100000):
+        # Returns cross-track error (meters, positive to the left of the path direction),
+        # along-track progress (meters from the path start) and the nearest segment index
+        positions = np.column_stack((np.asarray(x, dtype=float), np.asarray(y, dtype=float)))
+        segment = np.empty(len(positions), dtype=np.intp)
+        distance = np.empty(len(positions))
+        fraction = np.empty(len(positions))
+
+        # Chunks bound the (positions x k) temporary arrays for season-sized inputs
+        for start in range(0, len(positions), chunk_size):
+            chunk = slice(start, start + chunk_size)
+            segment[chunk], distance[chunk], fraction[chunk] = self.nearest_segments(positions[chunk], k)
+
+        vector = self.segment_vector[segment]
+        offset = positions - self.segment_start[segment]
+        side = np.sign(vector[:, 0] * offset[:, 1] - vector[:, 1] * offset[:, 0])
+        cross_track = np.where(side < 0, -distance, distance)
+        along_track = self.cumulative_distance[segment] + fraction * self.segment_length[segment]
+        return cross_track, along_track, segment
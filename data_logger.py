@@ -1,60 +1,176 @@
 #!/Library/Frameworks/Python.framework/Versions/3.12/bin/python3
 
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Image
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Image, Table, TableStyle
+from reportlab.platypus.flowables import HRFlowable
 from reportlab.lib.pagesizes import letter
-import subprocess
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.utils import ImageReader
+from reportlab.lib import colors
+from xml.sax.saxutils import escape
+import io
 import os
-from PIL import Image as PilImage
-from reportlab.platypus.flowables import Flowable
+import argparse
+import tempfile
+import pandas as pd
+from topic_subscriber import ProcessingContext, default_mode
+from map_plotter import MapPlotter
+from data_processor import report_sections, collect_summary
+from batch_processor import find_bags, find_map, run_in_pool
 
+bag_path = 'e0_rosbags/2023-12-06-15-32-37.bag'
+gps_topic = '/tric_navigation/gps/head_data'
+joystick_topic = '/tric_navigation/joystick_control'
+uvc_topic = '/tric_navigation/uvc_light_status'
+plc_feedback_topic = '/tric_navigation/plc_feedback'
+json_map = 'json_maps/testrow.json'
+output_file = 'output.pdf'
+output_dir = 'reports'
+index_file = 'index.pdf'
 
-def run_script(script_name, output_file):
+styles = getSampleStyleSheet()
+
+def map_elements(context):
+    # Plot into memory instead of a temporary output.png
+    buffer = io.BytesIO()
+    MapPlotter(context.json_map, context.gps_processor, fast=True).plot(buffer)
+    buffer.seek(0)
+
+    # Draw the plot at half its pixel size, as the old resized PNG was
+    width, height = ImageReader(buffer).getSize()
+    buffer.seek(0)
+    return [Image(buffer, width=width / 2, height=height / 2)]
+
+def table_element(df):
+    rows = [[''] + list(df.columns)]
+    for index, row in df.iterrows():
+        rows.append([index] + [round(value, 2) if isinstance(value, float) else value for value in row])
+    table = Table(rows)
+    table.setStyle(TableStyle([
+        ('FONTSIZE', (0, 0), (-1, -1), 7),
+        ('LINEBELOW', (0, 0), (-1, 0), 0.5, colors.black),
+    ]))
+    return table
+
+def summary_elements(sections):
     elements = []
+    for section in sections:
+        if section['separator']:
+            elements.append(HRFlowable(width='100%'))
+        elements.append(Paragraph(escape(section['title']), styles['Heading3']))
+        if section['table'] is not None and not section['table'].empty:
+            elements.append(table_element(section['table']))
+        else:
+            elements.append(Paragraph('<br/>'.join(escape(line) for line in section['lines'])))
+    return elements
+
+def build_report(context, output_file=output_file):
+    # One process, one loaded bag and map: the plot and every summary share the same context
+    elements = map_elements(context) + summary_elements(report_sections(context))
+
+    doc = SimpleDocTemplate(output_file, pagesize=letter)
+    doc.build(elements)
+    return output_file
+
+def report_names(bag_paths):
+    # <bag name>.pdf per bag, numbered when bags from different folders share a name
+    names, used = {}, set()
+    for bag in bag_paths:
+        stem = os.path.splitext(os.path.basename(bag))[0]
+        name, count = f"{stem}.pdf", 1
+        while name in used:
+            count += 1
+            name = f"{stem}_{count}.pdf"
+        used.add(name)
+        names[bag] = name
+    return names
+
+def fleet_report(bag_path, json_file_path, report_path):
+    # Runs in a worker process: one report plus the figures for the index page.
+    # The PDF is written under a unique temporary name and moved into place when complete.
     try:
-        # Run the script and capture both stdout and stderr
-        result = subprocess.run(['python3', script_name], stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
-
-        # If the output file exists (i.e., the script generated a PNG file), resize it, add it to the elements list
-        if os.path.exists(output_file):
-            # Open the image file
-            img = PilImage.open(output_file)
-            # Resize the image
-            img = img.resize((int(img.width / 2), int(img.height / 2)))
-            # Save the resized image back to the file
-            img.save(output_file)
-            # Add the image to the elements list
-            elements.append(Image(output_file))
-
-        # Replace newline characters with <br/> tags and underscores with <hr/>
-        formatted_text = result.stdout.replace('\n', '<br/>').replace('\n__________________________\n', '<hr/>')
-
-        # Add the output of the script to the elements list
-        text = Paragraph(formatted_text)
-        elements.append(text)
-
-        print(f"Script execution completed.")
-    except subprocess.CalledProcessError as e:
-        print(f"Error occurred: {e}")
-    
+        context = ProcessingContext(bag_path, json_file_path)
+        handle, temp_path = tempfile.mkstemp(suffix='.pdf', dir=os.path.dirname(report_path) or '.')
+        os.close(handle)
+        try:
+            build_report(context, temp_path)
+            os.chmod(temp_path, default_mode())
+            os.replace(temp_path, report_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        summary = collect_summary(context)
+        summary['report'] = os.path.basename(report_path)
+        summary['error'] = None
+    except Exception as e:
+        summary = {'bag_path': bag_path, 'json_map': json_file_path, 'report': None, 'error': f"{type(e).__name__}: {e}"}
+    return summary
+
+def index_elements(results_df):
+    elements = [Paragraph("Fleet Report", styles['Heading1'])]
+    rows = [['Bag', 'Report', 'Runtime (s)', 'Distance (m)', 'Auto time (%)', 'Status']]
+    # error is None for good bags, which pandas turns into NaN once any bag has failed
+    failed_mask = results_df['error'].notna()
+    for row, failed in zip(results_df.itertuples(), failed_mask):
+        if failed:
+            rows.append([os.path.basename(row.bag_path), '', '', '', '', 'failed'])
+            continue
+        rows.append([os.path.basename(row.bag_path), row.report, round(row.total_runtime, 2),
+                     round(row.total_distance, 2), round(row.percent_time_in_auto, 2), 'done'])
+    table = Table(rows)
+    table.setStyle(TableStyle([
+        ('FONTSIZE', (0, 0), (-1, -1), 8),
+        ('LINEBELOW', (0, 0), (-1, 0), 0.5, colors.black),
+    ]))
+    elements.append(table)
+
+    for row in results_df[failed_mask].itertuples():
+        elements.append(Paragraph(escape(f"{row.bag_path}: {row.error}")))
     return elements
 
-# Run the map_plotter.py script to generate a PNG file
-elements1 = run_script('map_plotter.py', 'output.png')
+def build_fleet_reports(bag_paths, default_map=json_map, map_dir=None, output_dir=output_dir, workers=None):
+    # One report per bag, generated in parallel, plus an index PDF listing them all
+    os.makedirs(output_dir, exist_ok=True)
+    names = report_names(bag_paths)
+    results = []
+
+    jobs = {bag: (bag, find_map(bag, default_map, map_dir), os.path.join(output_dir, names[bag])) for bag in bag_paths}
+    for bag, result, error in run_in_pool(fleet_report, jobs, workers):
+        if error is not None:
+            # The worker itself died, so fleet_report could not report the failure
+            result = {'bag_path': bag, 'json_map': find_map(bag, default_map, map_dir), 'report': None, 'error': f"{type(error).__name__}: {error}"}
+        status = 'failed' if result['error'] else 'done'
+        print(f"{status}: {bag}")
+        results.append(result)
 
-# Run the data_processor.py script to generate output text
-elements2 = run_script('data_processor.py', '')
+    results_df = pd.DataFrame(results).sort_values('bag_path').reset_index(drop=True)
+    index_path = os.path.join(output_dir, index_file)
+    SimpleDocTemplate(index_path, pagesize=letter).build(index_elements(results_df))
+    return results_df, index_path
 
-# Combine elements from both scripts
-elements = elements1 + elements2
+def main(context=None):
+    parser = argparse.ArgumentParser(description="Build the PDF report for one bag, or for a whole fleet of bags.")
+    parser.add_argument('--fleet', help="directory of .bag files or a glob pattern to report on in parallel")
+    parser.add_argument('--map', default=json_map, help="JSON map used for bags without their own map")
+    parser.add_argument('--map-dir', help="directory holding <bag name>.json maps")
+    parser.add_argument('--workers', type=int, help="number of worker processes (default: one per core)")
+    parser.add_argument('--output-dir', default=output_dir, help="directory for fleet reports and the index")
+    args = parser.parse_args()
 
-# Create a PDF
-doc = SimpleDocTemplate('output.pdf', pagesizes=letter)
+    if args.fleet:
+        bag_paths = find_bags(args.fleet)
+        if not bag_paths:
+            print(f"No bags found for {args.fleet}")
+            return
+        results_df, index_path = build_fleet_reports(bag_paths, args.map, args.map_dir, args.output_dir, args.workers)
+        failed = results_df['error'].notna().sum()
+        print(f"Reported on {len(results_df)} bags ({failed} failed). Index saved to {index_path}")
+        return
 
-# Build the PDF with the elements
-doc.build(elements)
+    if context is None:
+        context = ProcessingContext(bag_path, json_map, [gps_topic, joystick_topic, uvc_topic, plc_feedback_topic])
 
-# Delete the PNG file
-if os.path.exists('output.png'):
-    os.remove('output.png')
+    build_report(context, output_file)
+    print(f"Output saved to {output_file}")
 
-print(f"Output saved to output.pdf")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,14 @@
 import pandas as pd
 import numpy as np
 import math
+import sys
+import time
+from topic_subscriber import ProcessingContext
+from topic_subscriber import BagSession
 from topic_subscriber import JSONProcessor
+from topic_subscriber import MAP_SEGMENT_KINDS
+from topic_subscriber import TOPIC_COLUMNS
+from topic_subscriber import align_nearest
 from topic_subscriber import GPSDataProcessor
 from topic_subscriber import JoystickDataProcessor
 from topic_subscriber import UVCLightDataProcessor
@@ -17,9 +24,27 @@ uvc_topic = '/tric_navigation/uvc_light_status'
 plc_feedback_topic = '/tric_navigation/plc_feedback'
 json_map = 'json_maps/testrow.json'
 
+# PLC difference name -> (measured PLC feedback column, planned wing/boom column of the map)
+PLC_DIFFERENCES = {
+    'boom': ('boom_position', 'boom_pos'),
+    'left_wing': ('left_wing_position', 'left_wing_pos'),
+    'right_wing': ('right_wing_position', 'right_wing_pos'),
+}
+
+def run_length_encode(values):
+    # Start index, end index (inclusive) and value of each run of equal consecutive values
+    values = np.asarray(values)
+    if len(values) == 0:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp), values[:0]
+
+    change = np.flatnonzero(values[1:] != values[:-1]) + 1
+    starts = np.concatenate(([0], change))
+    ends = np.concatenate((change - 1, [len(values) - 1]))
+    return starts, ends, values[starts]
+
 class GPSDataLogger:
     def __init__(self, gps_data_processor):
-        self.gps_data = GPSDataProcessor(bag_path, [gps_topic])
+        self.gps_data = gps_data_processor
         self.gps_data_processor = gps_data_processor
         self.df = gps_data_processor.create_dataframe()
 
@@ -44,29 +69,48 @@ class GPSDataLogger:
         total_distance = np.sum(distances)
         return total_distance
     
-    def find_stops(self):
-        df = self.gps_data.create_dataframe()
+    def find_stops(self, max_speed=0.2, min_duration=1.0):
+        # Groups consecutive samples moving slower than `max_speed` m/s into stop events. A speed rather
+        # than a distance per step keeps the result the same whatever the GPS rate is.
+        # Stops shorter than `min_duration` seconds are dropped; max_speed=0 means exact equality.
+        df = self.df
+        columns = ['start_index', 'end_index', 'start_time', 'end_time', 'duration', 'x', 'y']
 
         if df.empty:
             print("DataFrame is empty.")
-            return pd.DataFrame()
+            return pd.DataFrame(columns=columns)
 
-        delta_x = df['x'].diff()
-        delta_y = df['y'].diff()
+        x = df['x'].to_numpy(dtype=float)
+        y = df['y'].to_numpy(dtype=float)
+        timestamp = df['timestamp'].to_numpy(dtype=float)
 
-        stop_indices = df.index[(delta_x == 0) & (delta_y == 0)].tolist()
+        # Interval i (sample i to i+1) is stationary if its step is at most max_speed times its duration
+        stationary = np.hypot(np.diff(x), np.diff(y)) <= max_speed * np.diff(timestamp)
+        starts, ends, values = run_length_encode(stationary)
+        starts = starts[values]
+        end_samples = ends[values] + 1
 
-        stop_data = []
-        for stop_index in stop_indices:
-            stop_duration = df.loc[stop_index, 'timestamp'] - df.loc[stop_index - 1, 'timestamp']
-            stop_data.append([stop_index, df.loc[stop_index, 'y'], df.loc[stop_index, 'x'], stop_duration])
+        # Stop location is the mean position over the stop, from cumulative sums
+        cumulative_x = np.concatenate(([0.0], np.cumsum(x)))
+        cumulative_y = np.concatenate(([0.0], np.cumsum(y)))
+        counts = end_samples - starts + 1
 
-        stop_df = pd.DataFrame(stop_data, columns=['Index', 'y', 'x', 'Duration'])
+        stop_df = pd.DataFrame({
+            'start_index': starts,
+            'end_index': end_samples,
+            'start_time': timestamp[starts],
+            'end_time': timestamp[end_samples],
+            'duration': timestamp[end_samples] - timestamp[starts],
+            'x': (cumulative_x[end_samples + 1] - cumulative_x[starts]) / counts,
+            'y': (cumulative_y[end_samples + 1] - cumulative_y[starts]) / counts
+        }, columns=columns)
+
+        stop_df = stop_df[stop_df['duration'] >= min_duration].reset_index(drop=True)
         return stop_df
     
 class JoystickDataLogger:
-    def __init__(self, gps_data_logger):
-        self.joystick_data = JoystickDataProcessor(bag_path, [joystick_topic])
+    def __init__(self, gps_data_logger, context):
+        self.joystick_data = context.get_processor(JoystickDataProcessor, [joystick_topic])
         self.gps_data_logger = gps_data_logger
     
     def time_between_assists(self):
@@ -76,7 +120,8 @@ class JoystickDataLogger:
             print("DataFrame is empty. Cannot calculate time of assists.")
             return []
 
-        df['timestamp'] = pd.to_datetime(df['timestamp'], unit='s')
+        # The merged frame is shared with other loggers, so convert into a separate Series
+        timestamps = pd.to_datetime(df['timestamp'], unit='s')
 
         # Create groups of consecutive True values
         groups = df['joystick_control'].ne(df['joystick_control'].shift()).cumsum()
@@ -95,13 +140,13 @@ class JoystickDataLogger:
                 'Assist': i + 1,
                 'start_index': start,
                 'end_index': end,
-                'time_between': round((df.loc[end, 'timestamp'] - df.loc[start, 'timestamp']).total_seconds() / 60, 2)
+                'time_between': round((timestamps.loc[end] - timestamps.loc[start]).total_seconds() / 60, 2)
             }
             for i, (start, end) in enumerate(assist_pairs)
         ]
 
         time_between_assists = [
-            round((df.loc[prev_end, 'timestamp'] - df.loc[start, 'timestamp']).total_seconds() / 60, 2)
+            round((timestamps.loc[prev_end] - timestamps.loc[start]).total_seconds() / 60, 2)
             for (prev_end, start) in zip(assist_ends[:-1], assist_starts[1:])
         ]
 
@@ -123,46 +168,58 @@ class JoystickDataLogger:
 
         return distance
     
-    def calculate_distances_and_times(self):
-        df = self.joystick_data.merge_dataframes()
+    def mode_intervals(self, df):
+        # Time (minutes) and distance of every interval between consecutive samples.
+        # The last sample has no outgoing interval, so it gets zeros.
+        time_diff = np.zeros(len(df))
+        distance = np.zeros(len(df))
+        time_diff[:-1] = np.diff(df['timestamp'].to_numpy(dtype=float)) / 60
+        distance[:-1] = np.hypot(np.diff(df['x'].to_numpy(dtype=float)), np.diff(df['y'].to_numpy(dtype=float)))
+        return time_diff, distance
 
-        # Ensure the DataFrame is not empty
+    def mode_segments(self):
+        # One row per stretch of consecutive samples in the same mode (joystick_control True = manual)
+        df = self.joystick_data.merge_dataframes()
+        columns = ['joystick_control', 'mode', 'start_index', 'end_index', 'start_time', 'end_time', 'duration_minutes', 'distance']
         if df.empty:
-            return 0, 0, 0, 0, 0
+            return pd.DataFrame(columns=columns)
 
-        # Convert 'timestamp' column to datetime format
-        df['timestamp'] = pd.to_datetime(df['timestamp'], unit='s')
+        time_diff, distance = self.mode_intervals(df)
+        starts, ends, modes = run_length_encode(df['joystick_control'].to_numpy(dtype=bool))
+        timestamp = df['timestamp'].to_numpy(dtype=float)
 
-        # Initialize variables for distances and times
-        distance_in_manual = 0
-        distance_in_auto = 0
-        time_in_manual_minutes = 0
-        time_in_auto_minutes = 0
+        # Each interval counts towards the mode of the sample it starts from
+        segments = pd.DataFrame({
+            'joystick_control': modes,
+            'mode': np.where(modes, 'manual', 'auto'),
+            'start_index': starts,
+            'end_index': ends,
+            'start_time': timestamp[starts],
+            'end_time': timestamp[np.minimum(ends + 1, len(df) - 1)],
+            'duration_minutes': np.add.reduceat(time_diff, starts),
+            'distance': np.add.reduceat(distance, starts)
+        })
+        return segments
 
-        # Initialize variables to track the current mode and timestamp
-        current_mode = df['joystick_control'].iloc[0]
-        current_timestamp = df['timestamp'].iloc[0]
-
-        for i in range(1, len(df)):
-            time_diff = (df.loc[i, 'timestamp'] - current_timestamp).total_seconds() / 60
-            distance = self.calculate_distance(df.loc[i-1], df.loc[i])
+    def calculate_distances_and_times(self):
+        df = self.joystick_data.merge_dataframes()
 
-            if current_mode:
-                time_in_manual_minutes += time_diff
-                distance_in_manual += distance
-            else:
-                time_in_auto_minutes += time_diff
-                distance_in_auto += distance
+        # Ensure the DataFrame is not empty
+        if df.empty:
+            return 0, 0, 0, 0, 0, 0
 
-            if df.loc[i, 'joystick_control'] != current_mode:
-                current_mode = df.loc[i, 'joystick_control']
+        time_diff, distance = self.mode_intervals(df)
+        manual = df['joystick_control'].to_numpy(dtype=bool)
 
-            current_timestamp = df.loc[i, 'timestamp']
+        time_in_manual_minutes = time_diff[manual].sum()
+        time_in_auto_minutes = time_diff[~manual].sum()
+        distance_in_manual = distance[manual].sum()
+        distance_in_auto = distance[~manual].sum()
 
         # Calculate percentages
         total_time = time_in_manual_minutes + time_in_auto_minutes
-        percent_time_in_auto = (time_in_auto_minutes / total_time) * 100
-        percent_time_in_manual = 100 - percent_time_in_auto
+        percent_time_in_auto = (time_in_auto_minutes / total_time) * 100 if total_time else 0
+        percent_time_in_manual = 100 - percent_time_in_auto if total_time else 0
 
         return (
             time_in_manual_minutes,
@@ -175,267 +232,849 @@ class JoystickDataLogger:
 
 class UVCLightDataLogger:
     def __init__(self, uvc_data_processor):
-        self.uvc_data = UVCLightDataProcessor(bag_path, [uvc_topic])
+        self.uvc_data = uvc_data_processor
         self.uvc_data_processor = uvc_data_processor
-        self.uvc_df = uvc_data_processor.create_dataframe()
+        # Every light status sample with its nearest GPS position
+        self.uvc_df = uvc_data_processor.merge_gps()
 
-    def payload_runtime(self):
-        # Convert the 'timestamp' column to datetime format
-        self.uvc_df['timestamp'] = pd.to_datetime(self.uvc_df['timestamp'], unit='s')
-        # Filter rows where uvc_light_status is '000' (lights off)
-        lights_off_data = self.uvc_df[self.uvc_df['uvc_light_status'] == '000']
-        # Filter rows where uvc_light_status is '111' (lights on)
-        lights_on_data = self.uvc_df[self.uvc_df['uvc_light_status'] == '111']
-        # Calculate the total time lights were off
-        total_lights_off_time = lights_off_data['timestamp'].diff().sum()
-        # Calculate the total time lights were on
-        total_lights_on_time = lights_on_data['timestamp'].diff().sum()
-        # Print the results
-        print(f"Total time lights were off: {total_lights_off_time}")
-        print(f"Total time lights were on: {total_lights_on_time}")
+    def payload_intervals(self):
+        # Time (seconds) and distance from every sample to the next one.
+        # The last sample has no outgoing interval, so it gets zeros.
+        duration = np.zeros(len(self.uvc_df))
+        distance = np.zeros(len(self.uvc_df))
+        duration[:-1] = np.diff(self.uvc_df['t'].to_numpy(dtype=np.int64)) / 1e9
+        distance[:-1] = np.hypot(np.diff(self.uvc_df['x'].to_numpy(dtype=float)), np.diff(self.uvc_df['y'].to_numpy(dtype=float)))
+        return duration, distance
+
+    def payload_segments(self):
+        # One row per stretch of consecutive samples with the same light status
+        columns = ['uvc_light_status', 'start_index', 'end_index', 'start_time', 'end_time', 'duration', 'distance']
+        df = self.uvc_df
+        if df.empty:
+            return pd.DataFrame(columns=columns)
+
+        duration, distance = self.payload_intervals()
+        starts, ends, states = run_length_encode(df['uvc_light_status'].to_numpy(dtype=str))
+        timestamp = df['timestamp'].to_numpy(dtype=float)
+
+        # Each interval counts towards the status of the sample it starts from, so the
+        # time between two on-periods is counted as off rather than as on
+        segments = pd.DataFrame({
+            'uvc_light_status': states,
+            'start_index': starts,
+            'end_index': ends,
+            'start_time': timestamp[starts],
+            'end_time': timestamp[np.minimum(ends + 1, len(df) - 1)],
+            'duration': np.add.reduceat(duration, starts),
+            'distance': np.add.reduceat(distance, starts)
+        })
+        return segments
+
+    def payload_states(self):
+        # Total duration (seconds) and distance (meters) per light status
+        segments = self.payload_segments()
+        return segments.groupby('uvc_light_status')[['duration', 'distance']].sum()
+
+    def lamp_breakdown(self):
+        # Each character of the status is one lamp ('1' = on): time and distance with each lamp on
+        segments = self.payload_segments()
+        if segments.empty:
+            return pd.DataFrame(columns=['lamp', 'on_duration', 'on_distance'])
+
+        states = segments['uvc_light_status'].to_numpy(dtype=str)
+        width = int(np.char.str_len(states).max())
+        bits = np.frombuffer(states.astype(f'S{width}').tobytes(), dtype='S1').reshape(len(states), width) == b'1'
+        return pd.DataFrame({
+            'lamp': np.arange(1, width + 1),
+            'on_duration': segments['duration'].to_numpy(dtype=float) @ bits,
+            'on_distance': segments['distance'].to_numpy(dtype=float) @ bits
+        })
+
+    def payload_times(self):
+        totals = self.payload_states()['duration']
+        total_lights_off_time = pd.Timedelta(seconds=totals.get('000', 0.0))
+        total_lights_on_time = pd.Timedelta(seconds=totals.get('111', 0.0))
+        return total_lights_off_time, total_lights_on_time
 
     def payload_distance(self):
-        # Ensure the DataFrame is not empty
+        # Positions are already meters from the datum, so distances are plain Euclidean steps
         if self.uvc_df.empty:
-            print("DataFrame is empty. Cannot calculate payload distance.")
-            return
-        # Convert the 'timestamp' column to datetime format
-        self.uvc_df['timestamp'] = pd.to_datetime(self.uvc_df['timestamp'], unit='s')
-        # Filter rows where uvc_light_status is '111' (lights on)
-        lights_on_data = self.uvc_df[self.uvc_df['uvc_light_status'] == '111']
-        # Calculate the distance traveled when lights were on
-        total_distance = 0.0
-        # Iterate through consecutive rows with lights on to calculate distance
-        for i in range(len(lights_on_data) - 1):
-            lat1, lon1 = lights_on_data.iloc[i]['y'], lights_on_data.iloc[i]['x']
-            lat2, lon2 = lights_on_data.iloc[i + 1]['y'], lights_on_data.iloc[i + 1]['x']
-            # Calculate distance between consecutive rows
-            distance = self.haversine_distance(lat1, lon1, lat2, lon2)
-            # Accumulate the total distance
-            total_distance += distance
-        # Print the result
-        print(f"Total distance traveled with Payload: {total_distance} meters")
-        return total_distance
+            return None
+        return self.payload_states()['distance'].get('111', 0.0)
+
+    def payload_runtime_lines(self):
+        total_lights_off_time, total_lights_on_time = self.payload_times()
+        return [f"Total time lights were off: {total_lights_off_time}",
+                f"Total time lights were on: {total_lights_on_time}"]
+
+    def payload_distance_lines(self):
+        total_distance = self.payload_distance()
+        if total_distance is None:
+            return ["DataFrame is empty. Cannot calculate payload distance."]
+        return [f"Total distance traveled with Payload: {round(total_distance, 2)} meters"]
+
+    def lamp_breakdown_lines(self):
+        return [f"Lamp {lamp.lamp}: on for {round(lamp.on_duration, 2)} seconds, {round(lamp.on_distance, 2)} meters"
+                for lamp in self.lamp_breakdown().itertuples()]
+
+    def payload_runtime(self):
+        for line in self.payload_runtime_lines():
+            print(line)
+
+    def print_payload_distance(self):
+        for line in self.payload_distance_lines():
+            print(line)
+
+    def print_lamp_breakdown(self):
+        for line in self.lamp_breakdown_lines():
+            print(line)
 
 class JSONDataLogger:
-    def __init__(self):
-        self.json_data = JSONProcessor(json_map)
+    def __init__(self, context):
+        self.json_data = context.json_map
 
     def calculate_distance(self, point1, point2):
         x_diff = point2['x'] - point1['x']
         y_diff = point2['y'] - point1['y']
         return math.sqrt(x_diff**2 + y_diff**2)
-    
-    def calculate_ideal_time(self, points, speed):
-        total_distance = sum(self.calculate_distance(points[i], points[i+1]) for i in range(len(points) - 1))
-        time = total_distance / speed
-        return time
+
+    def segment_ideal_times(self, treatment_speed=0.8, non_treatment_speed=0.8, speed_profile=None):
+        # Distance, speed and ideal time (minutes) for every map segment.
+        # speed_profile overrides the speeds, either as {kind: speed} or as one speed per segment.
+        segments = self.json_data.segments[['kind', 'start', 'stop']].copy()
+        segments['distance'] = self.json_data.segment_distances()
+
+        speeds = np.where(segments['kind'] == 'row', treatment_speed, non_treatment_speed).astype(float)
+        if isinstance(speed_profile, dict):
+            for kind, speed in speed_profile.items():
+                speeds[(segments['kind'] == kind).to_numpy()] = speed
+        elif speed_profile is not None:
+            speeds = np.asarray(speed_profile, dtype=float)
+        segments['speed'] = speeds
+
+        segments['ideal_time'] = segments['distance'] / segments['speed'] / 60
+        return segments
 
     def calculate_total_distances(self):
-        total_distances = {}
-        for key in ['rows', 'turns', 'start_path', 'end_path']:
-            points = self.json_data.data[key]
-            total_distances[key] = sum(self.calculate_distance(points[i], points[i+1]) for i in range(len(points) - 1))
-        return total_distances
-
-    def ideal_times(self, treatment_speed=0.8, non_treatment_speed=0.8):
-        rows_ideal_time = self.calculate_ideal_time(self.json_data.data['rows'], treatment_speed)/60
-        turns_ideal_time = self.calculate_ideal_time(self.json_data.data['turns'], non_treatment_speed)/60
-        start_path_ideal_time = self.calculate_ideal_time(self.json_data.data['start_path'], non_treatment_speed)/60
-        end_path_ideal_time = self.calculate_ideal_time(self.json_data.data['end_path'], non_treatment_speed)/60
+        # Each segment is measured on its own, so gaps between rows (or between turns) are not counted
+        distances = pd.Series(self.json_data.segment_distances()).groupby(self.json_data.segments['kind'].to_numpy()).sum()
+        return {key: distances.get(kind, 0.0) for key, kind in MAP_SEGMENT_KINDS.items()}
 
-        return {
-            'rows': rows_ideal_time,
-            'turns': turns_ideal_time,
-            'start_path': start_path_ideal_time,
-            'end_path': end_path_ideal_time
-        }
+    def ideal_times(self, treatment_speed=0.8, non_treatment_speed=0.8, speed_profile=None):
+        segments = self.segment_ideal_times(treatment_speed, non_treatment_speed, speed_profile)
+        times = segments.groupby('kind')['ideal_time'].sum()
+        return {key: times.get(kind, 0.0) for key, kind in MAP_SEGMENT_KINDS.items()}
     
+    def total_distance_lines(self):
+        return [f"Total Distance {key.capitalize()}: {round(value, 2)} meters" for key, value in self.calculate_total_distances().items()]
+
+    def ideal_time_lines(self):
+        return [f"Ideal Time {key.capitalize()}: {round(value, 2)} minutes" for key, value in self.ideal_times().items()]
+
     def print_total_distances(self):
-        total_distances = self.calculate_total_distances()
-        for key, value in total_distances.items():
-            print(f"Total Distance {key.capitalize()}: {round(value, 2)} meters")
+        for line in self.total_distance_lines():
+            print(line)
     
     def print_ideal_times(self):
-        ideal_times = self.ideal_times()
-        for key, value in ideal_times.items():
-            print(f"Ideal Time {key.capitalize()}: {round(value, 2)} minutes")
+        for line in self.ideal_time_lines():
+            print(line)
+
+class CrossTrackDataLogger:
+    def __init__(self, gps_data_logger, context):
+        self.gps_data_logger = gps_data_logger
+        self.json_data = context.json_map
+
+    def calculate_cross_track(self):
+        # Every GPS fix with its signed distance from the planned path and progress along it
+        df = self.gps_data_logger.df
+        cross_track, along_track, segment = self.json_data.cross_track_engine().query(df['x'].to_numpy(), df['y'].to_numpy())
+        return pd.DataFrame({
+            'timestamp': df['timestamp'].to_numpy(),
+            'x': df['x'].to_numpy(),
+            'y': df['y'].to_numpy(),
+            'cross_track_error': cross_track,
+            'along_track': along_track,
+            'path_segment': segment
+        })
+
+    def cross_track_summary(self):
+        cross_track_error = self.calculate_cross_track()['cross_track_error'].to_numpy()
+        if not len(cross_track_error):
+            return {'mean_abs': 0.0, 'rms': 0.0, 'max_abs': 0.0}
+        return {
+            'mean_abs': np.abs(cross_track_error).mean(),
+            'rms': np.sqrt(np.mean(cross_track_error**2)),
+            'max_abs': np.abs(cross_track_error).max()
+        }
+
+    def cross_track_lines(self):
+        summary = self.cross_track_summary()
+        return [f"Mean absolute cross-track error: {round(summary['mean_abs'], 2)} meters",
+                f"RMS cross-track error: {round(summary['rms'], 2)} meters",
+                f"Maximum cross-track error: {round(summary['max_abs'], 2)} meters"]
+
+    def print_cross_track_summary(self):
+        for line in self.cross_track_lines():
+            print(line)
 
 class PLCDataLogger:
-    def __init__(self, bag_path, plc_feedback_topic, json_file_path):
-        self.json_processor = JSONProcessor(json_file_path)
-        self.plc_processor = PLCFeedbackDataProcessor(bag_path, [plc_feedback_topic], self.json_processor)
+    def __init__(self, context):
+        self.json_processor = context.json_map
+        self.plc_processor = context.get_processor(PLCFeedbackDataProcessor, [plc_feedback_topic])
         self.dataframe = self.plc_processor.merge_dataframes()
+        self.segments = self.build_segment_index()
+
+    def build_segment_index(self):
+        # Run-length encode treatment_area once; every finder and average below is served from this table.
+        # Runs inside the treatment area are rows, the gaps between rows are turns,
+        # and the leading/trailing gaps are the start and end paths.
+        treatment_area = self.dataframe['treatment_area'].to_numpy(dtype=bool)
+        starts, stops, in_treatment_area = run_length_encode(treatment_area)
+
+        kinds = np.where(in_treatment_area, 'row', 'turn').astype(object)
+        if len(kinds) and not in_treatment_area[0]:
+            kinds[0] = 'start_path'
+        if len(kinds) and not in_treatment_area[-1]:
+            kinds[-1] = 'end_path'
+
+        # Mean absolute difference per run, skipping missing values like pandas' mean()
+        means = {}
+        for name, measured, planned in [('boom_diff', 'boom_position', 'boom_pos'),
+                                        ('left_wing_diff', 'left_wing_position', 'left_wing_pos'),
+                                        ('right_wing_diff', 'right_wing_position', 'right_wing_pos')]:
+            diff = np.abs(self.dataframe[measured].to_numpy(dtype=float) - self.dataframe[planned].to_numpy(dtype=float))
+            valid = ~np.isnan(diff)
+            if len(starts):
+                totals = np.add.reduceat(np.where(valid, diff, 0), starts)
+                counts = np.add.reduceat(valid.astype(int), starts)
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    means[name] = totals / counts
+            else:
+                means[name] = np.empty(0)
+
+        segments = pd.DataFrame({
+            'kind': kinds,
+            'start': starts,
+            'stop': stops,
+            'length': stops - starts + 1,
+            **means
+        })
+
+        # A map run that never enters the treatment area is both the start and the end path
+        if len(segments) == 1 and segments['kind'].iloc[0] == 'end_path':
+            segments = pd.concat([segments.assign(kind='start_path'), segments], ignore_index=True)
+
+        return segments
+
+    def find_segments(self, kind):
+        return self.segments[self.segments['kind'] == kind]
 
     def find_rows(self):
-        start_index = None
-        rows = []
-        for i, row in self.dataframe.iterrows():
-            if row['treatment_area'] and start_index is None:
-                start_index = i
-            elif not row['treatment_area'] and start_index is not None:
-                rows.append((start_index, i - 1))
-                start_index = None
-        if start_index is not None:
-            rows.append((start_index, i))
-        return rows
+        rows = self.find_segments('row')
+        return list(zip(rows['start'].tolist(), rows['stop'].tolist()))
     
     def find_turns(self):
-        turns = []
-        turn_start_index = None
-        prev_row_treatment_area = False
-        for i, row in self.dataframe.iterrows():
-            if not row['treatment_area'] and prev_row_treatment_area:
-                turn_start_index = i
-            elif row['treatment_area'] and turn_start_index is not None:
-                turns.append((turn_start_index, i - 1))
-                turn_start_index = None
-            prev_row_treatment_area = row['treatment_area']
-        return turns
+        turns = self.find_segments('turn')
+        return list(zip(turns['start'].tolist(), turns['stop'].tolist()))
     
     def find_start_path(self):
-        start_path = []
-        for i, row in self.dataframe.iterrows():
-            if not row['treatment_area']:
-                start_path.append(i)
-            else:
-                break
-        return start_path
+        start_path = self.find_segments('start_path')
+        if start_path.empty:
+            return []
+        return list(range(start_path['start'].iloc[0], start_path['stop'].iloc[0] + 1))
     
     def find_end_path(self):
-        end_path = []
-        for i in reversed(range(len(self.dataframe))):
-            if not self.dataframe.iloc[i]['treatment_area']:
-                end_path.append(i)
-            else:
-                break
-        return list(reversed(end_path))
+        end_path = self.find_segments('end_path')
+        if end_path.empty:
+            return []
+        return list(range(end_path['start'].iloc[0], end_path['stop'].iloc[0] + 1))
+
+    def calculate_average_differences(self, start, stop):
+        # Segments from the index are looked up; any other range is computed from the slice
+        match = self.segments[(self.segments['start'] == start) & (self.segments['stop'] == stop)]
+        if not match.empty:
+            segment = match.iloc[0]
+            return segment['boom_diff'], segment['left_wing_diff'], segment['right_wing_diff']
 
-    def calculate_average_differences_rows(self, start, stop):
         df_slice = self.dataframe.iloc[start:stop+1]
         boom_diff = (df_slice['boom_position'] - df_slice['boom_pos']).abs().mean()
         left_wing_diff = (df_slice['left_wing_position'] - df_slice['left_wing_pos']).abs().mean()
         right_wing_diff = (df_slice['right_wing_position'] - df_slice['right_wing_pos']).abs().mean()
         return boom_diff, left_wing_diff, right_wing_diff
+
+    def calculate_average_differences_rows(self, start, stop):
+        return self.calculate_average_differences(start, stop)
     
     def calculate_average_differences_turns(self, start, stop):
-        df_slice = self.dataframe.iloc[start:stop+1]
-        boom_diff = (df_slice['boom_position'] - df_slice['boom_pos']).abs().mean()
-        left_wing_diff = (df_slice['left_wing_position'] - df_slice['left_wing_pos']).abs().mean()
-        right_wing_diff = (df_slice['right_wing_position'] - df_slice['right_wing_pos']).abs().mean()
-        return boom_diff, left_wing_diff, right_wing_diff
+        return self.calculate_average_differences(start, stop)
     
     def calculate_average_differences_start_path(self):
-        start_path = self.find_start_path()
-        if not start_path:
+        start_path = self.find_segments('start_path')
+        if start_path.empty:
             return None, None, None
-        df_slice = self.dataframe.iloc[start_path[0]:start_path[-1]+1]
-        boom_diff = (df_slice['boom_position'] - df_slice['boom_pos']).abs().mean()
-        left_wing_diff = (df_slice['left_wing_position'] - df_slice['left_wing_pos']).abs().mean()
-        right_wing_diff = (df_slice['right_wing_position'] - df_slice['right_wing_pos']).abs().mean()
-        return boom_diff, left_wing_diff, right_wing_diff
+        segment = start_path.iloc[0]
+        return segment['boom_diff'], segment['left_wing_diff'], segment['right_wing_diff']
     
     def calculate_average_differences_end_path(self):
-        end_path = self.find_end_path()
-        if not end_path:
+        end_path = self.find_segments('end_path')
+        if end_path.empty:
             return None, None, None
-        df_slice = self.dataframe.iloc[end_path[0]:end_path[-1]+1]
-        boom_diff = (df_slice['boom_position'] - df_slice['boom_pos']).abs().mean()
-        left_wing_diff = (df_slice['left_wing_position'] - df_slice['left_wing_pos']).abs().mean()
-        right_wing_diff = (df_slice['right_wing_position'] - df_slice['right_wing_pos']).abs().mean()
-        return boom_diff, left_wing_diff, right_wing_diff
+        segment = end_path.iloc[0]
+        return segment['boom_diff'], segment['left_wing_diff'], segment['right_wing_diff']
+
+    def segment_lines(self, kind):
+        # Two lines per segment: its index range, then its average boom and wing differences
+        labels = {'row': "Row", 'turn': "Turn", 'start_path': "Start Path", 'end_path': "End Path"}
+        segments = self.find_segments(kind)
+        if kind in ('start_path', 'end_path'):
+            if segments.empty:
+                return [f"No {labels[kind].lower()} found."]
+            names = [labels[kind]]
+            segments = segments.iloc[:1]
+        else:
+            names = [f"{labels[kind]} {i}" for i in range(1, len(segments) + 1)]
+
+        lines = []
+        for name, segment in zip(names, segments.itertuples()):
+            lines.append(f"{name}: Start index = {segment.start}, Stop index = {segment.stop}, ")
+            lines.append(f"Average differences - Boom: {segment.boom_diff}, Left Wing: {segment.left_wing_diff}, Right Wing: {segment.right_wing_diff}")
+        return lines
+
+    def print_segments(self, kind):
+        for line in self.segment_lines(kind):
+            print(line)
 
     def print_rows(self):
-        rows = self.find_rows()
-        for i, (start, stop) in enumerate(rows, start=1):
-            boom_diff, left_wing_diff, right_wing_diff = self.calculate_average_differences_rows(start, stop)
-            print(f"Row {i}: Start index = {start}, Stop index = {stop}, "
-                  f"\nAverage differences - Boom: {boom_diff}, Left Wing: {left_wing_diff}, Right Wing: {right_wing_diff}")
+        self.print_segments('row')
             
     def print_turns(self):
-        turns = self.find_turns()
-        for i, (start, stop) in enumerate(turns, start=1):
-            boom_diff, left_wing_diff, right_wing_diff = self.calculate_average_differences_turns(start, stop)
-            print(f"Turn {i}: Start index = {start}, Stop index = {stop}, "
-                  f"\nAverage differences - Boom: {boom_diff}, Left Wing: {left_wing_diff}, Right Wing: {right_wing_diff}")
+        self.print_segments('turn')
             
     def print_start_path(self):
-        start_path = self.find_start_path()
-        if not start_path:
-            print("No start path found.")
-            return
-        boom_diff, left_wing_diff, right_wing_diff = self.calculate_average_differences_start_path()
-        print(f"Start Path: Start index = {start_path[0]}, Stop index = {start_path[-1]}, "
-              f"\nAverage differences - Boom: {boom_diff}, Left Wing: {left_wing_diff}, Right Wing: {right_wing_diff}")
+        self.print_segments('start_path')
         
     def print_end_path(self):
-        end_path = self.find_end_path()
-        if not end_path:
-            print("No end path found.")
-            return
-        boom_diff, left_wing_diff, right_wing_diff = self.calculate_average_differences_end_path()
-        print(f"End Path: Start index = {end_path[0]}, Stop index = {end_path[-1]}, "
-              f"\nAverage differences - Boom: {boom_diff}, Left Wing: {left_wing_diff}, Right Wing: {right_wing_diff}")
+        self.print_segments('end_path')
 
-def main():
+def create_loggers(context):
+    # Processors come from the context so their cached frames are shared between loggers
+    gps_logger = GPSDataLogger(context.get_processor(GPSDataProcessor, [gps_topic]))
+    joystick_logger = JoystickDataLogger(gps_logger, context)
+    uvc_logger = UVCLightDataLogger(context.get_processor(UVCLightDataProcessor, [uvc_topic]))
+    json_logger = JSONDataLogger(context)
+    plc_logger = PLCDataLogger(context)
+    cross_track_logger = CrossTrackDataLogger(gps_logger, context)
+    return gps_logger, joystick_logger, uvc_logger, json_logger, plc_logger, cross_track_logger
 
-    gps_logger = GPSDataLogger(GPSDataProcessor(bag_path, [gps_topic]))
-    joystick_logger = JoystickDataLogger(gps_logger)
-    uvc_logger = UVCLightDataLogger(UVCLightDataProcessor(bag_path, [uvc_topic]) )
-    json_logger = JSONDataLogger()
-    plc_logger = PLCDataLogger(bag_path, plc_feedback_topic, json_map)
+def collect_summary(context, loggers=None):
+    # The figures main() prints, as one flat dict per bag for batch runs
+    if loggers is None:
+        loggers = create_loggers(context)
+    gps_logger, joystick_logger, uvc_logger, json_logger, plc_logger, cross_track_logger = loggers
     time_in_manual_minutes, time_in_auto_minutes, distance_in_manual, distance_in_auto, percent_time_in_manual, percent_time_in_auto = joystick_logger.calculate_distances_and_times()
+    cross_track = cross_track_logger.cross_track_summary()
+    total_lights_off_time, total_lights_on_time = uvc_logger.payload_times()
+    stops = gps_logger.find_stops()
+    boom_diff, left_wing_diff, right_wing_diff = plc_logger.calculate_average_differences_rows(0, len(plc_logger.dataframe) - 1)
 
-    #JSON SUMMARY
-    print("\nJSON Distance Summary\n")
-    json_logger.print_total_distances()
+    # Receive time of the first message in the bag, as Unix seconds
+    first_t = [columns['t'][0] for columns in context.bag_session.columns.values() if len(columns['t'])]
 
-    #JSON Ideal Time SUMMARY
-    print("\nJSON Ideal Time Summary\n")
-    json_logger.print_ideal_times()
+    summary = {
+        'bag_path': context.bag_path,
+        'json_map': context.json_file_path,
+        'run_start': min(first_t) / 1e9 if first_t else None,
+    }
+    for key, value in json_logger.calculate_total_distances().items():
+        summary[f'map_distance_{key}'] = value
+    for key, value in json_logger.ideal_times().items():
+        summary[f'ideal_time_{key}'] = value
+    summary.update({
+        'total_runtime': gps_logger.calculate_runtime(),
+        'total_distance': gps_logger.calculate_distances(),
+        'stops': len(stops),
+        'stop_time': stops['duration'].sum(),
+        'cross_track_mean_abs': cross_track['mean_abs'],
+        'cross_track_rms': cross_track['rms'],
+        'cross_track_max_abs': cross_track['max_abs'],
+        'time_in_manual_minutes': time_in_manual_minutes,
+        'time_in_auto_minutes': time_in_auto_minutes,
+        'distance_in_manual': distance_in_manual,
+        'distance_in_auto': distance_in_auto,
+        'percent_time_in_manual': percent_time_in_manual,
+        'percent_time_in_auto': percent_time_in_auto,
+        'lights_off_seconds': pd.Timedelta(total_lights_off_time).total_seconds(),
+        'lights_on_seconds': pd.Timedelta(total_lights_on_time).total_seconds(),
+        'plc_rows': len(plc_logger.find_rows()),
+        'plc_turns': len(plc_logger.find_turns()),
+        'plc_boom_diff': boom_diff,
+        'plc_left_wing_diff': left_wing_diff,
+        'plc_right_wing_diff': right_wing_diff,
+    })
+    return summary
 
-    #Runtime SUMMARY
-    print("\n__________________________\n")
-    print("\nRuntime Summary\n")
-    total_runtime = gps_logger.calculate_runtime()
-    print(f"Total Runtime: {round(total_runtime, 2)}")
+def collect_run(context):
+    # The summary plus the per-segment PLC differences and stop events, for the run store
+    loggers = create_loggers(context)
+    gps_logger, joystick_logger, uvc_logger, json_logger, plc_logger, cross_track_logger = loggers
+    return {
+        'summary': collect_summary(context, loggers),
+        'segments': plc_logger.segments,
+        'stops': gps_logger.find_stops(),
+    }
+
+class RunningTotals:
+    # Distance, runtime, mode time, payload time, cross-track error, stops and PLC differences kept up
+    # to date as data arrives, so a long or still recording bag (or a live robot) never has to be
+    # re-summarised from scratch. update() takes batches of new columns; the add_* methods take single
+    # messages. Joystick and PLC samples go on the GPS fix nearest in time, as in the fused timeline,
+    # so samples newer than the newest fix wait for the next one; finish() places what is left on the
+    # last fix once the bag has ended. Only the state needed to carry on is kept between batches.
+
+    def __init__(self, datum, json_map=None, stop_max_speed=0.2, stop_min_duration=1.0):
+        self.datum = datum
+        self.json_map = json_map
+        self.stop_max_speed = stop_max_speed
+        self.stop_min_duration = stop_min_duration
+        self.first_t = None             # receive time (ns) of the first message of any topic
+        self.first_stamp = None
+        self.last_stamp = None
+        self.last_fix = None            # (t, x, y) of the newest GPS fix
+        self.fixes = None               # latest GPS batch plus the fix before it
+        self.pending = {}               # topic -> columns of joystick/PLC samples newer than the newest fix
+        self.last_mode = None           # (t, x, y, joystick_control) of the last kept joystick sample
+        self.last_payload = None        # (t, uvc_light_status) of the newest UVC sample
+        self.total_distance = 0.0
+        self.mode_time = {True: 0.0, False: 0.0}        # seconds, keyed by joystick_control
+        self.mode_distance = {True: 0.0, False: 0.0}
+        self.payload_time = {}                          # seconds, keyed by uvc_light_status
+        self.cross_track = {'sum_abs': 0.0, 'sum_squares': 0.0, 'max_abs': 0.0, 'count': 0}
+        self.plc_seen = set()           # (x, y) positions a PLC sample was already counted at
+        self.plc_row_count = 0          # PLC samples counted, one per position as in merge_dataframes
+        self.plc_sums = {name: 0.0 for name in PLC_DIFFERENCES}     # summed absolute differences, NaN skipped
+        self.plc_counts = {name: 0 for name in PLC_DIFFERENCES}
+        self.plc_runs = []              # closed treatment area runs, [in_treatment_area, start, stop, sums, counts]
+        self.open_run = None            # the run the newest PLC sample belongs to
+        self.fix_count = 0
+        self.stop_events = []           # closed stops, as find_stops rows
+        self.open_stop = None           # [start_index, start_time, sum_x, sum_y, count] of a stop still going on
+
+    @property
+    def total_runtime(self):
+        if self.first_stamp is None:
+            return 0.0
+        return (self.last_stamp - self.first_stamp) / 1e9
+
+    @property
+    def last_timestamp(self):
+        # Header stamp of the newest fix, in seconds since the first one
+        return (self.last_stamp - self.first_stamp) / 1e9
+
+    @property
+    def plc_differences(self):
+        # Mean absolute difference between measured and planned positions
+        return {name: self.plc_sums[name] / self.plc_counts[name] if self.plc_counts[name] else None for name in PLC_DIFFERENCES}
+
+    @property
+    def plc_segments(self):
+        # Same table as PLCDataLogger.segments; the run still going on is included
+        runs = self.plc_runs + ([self.open_run] if self.open_run is not None else [])
+        rows = []
+        for i, (in_treatment_area, start, stop, sums, counts) in enumerate(runs):
+            kind = 'row' if in_treatment_area else 'turn'
+            if not in_treatment_area and i == 0:
+                kind = 'start_path'
+            if not in_treatment_area and i == len(runs) - 1:
+                kind = 'end_path'
+            rows.append([kind, start, stop, stop - start + 1] +
+                        [sums[name] / counts[name] if counts[name] else np.nan for name in PLC_DIFFERENCES])
+        segments = pd.DataFrame(rows, columns=['kind', 'start', 'stop', 'length'] + [f'{name}_diff' for name in PLC_DIFFERENCES])
+
+        # A run that never enters the treatment area is both the start and the end path
+        if len(segments) == 1 and segments['kind'].iloc[0] == 'end_path':
+            segments = pd.concat([segments.assign(kind='start_path'), segments], ignore_index=True)
+        return segments
+
+    @property
+    def stops(self):
+        # Same columns as GPSDataLogger.find_stops; a stop still going on counts if long enough already
+        columns = ['start_index', 'end_index', 'start_time', 'end_time', 'duration', 'x', 'y']
+        events = list(self.stop_events)
+        if self.open_stop is not None:
+            event = self.stop_event(self.open_stop, self.fix_count - 1, self.last_timestamp)
+            if event is not None:
+                events.append(event)
+        return pd.DataFrame(events, columns=columns)
+
+    def stop_event(self, stop, end_index, end_time):
+        start_index, start_time, sum_x, sum_y, count = stop
+        duration = end_time - start_time
+        if duration < self.stop_min_duration:
+            return None
+        return (start_index, end_index, start_time, end_time, duration, sum_x / count, sum_y / count)
+
+    def close_stop(self, end_index, end_time):
+        if self.open_stop is not None:
+            event = self.stop_event(self.open_stop, end_index, end_time)
+            if event is not None:
+                self.stop_events.append(event)
+            self.open_stop = None
+
+    def update_stops(self, x, y, timestamp, first_index):
+        # x, y and timestamp start with the previous fix when there is one; first_index is its index.
+        # Runs of stationary steps become stops; a run reaching the newest fix stays open.
+        if len(x) < 2:
+            return
+        stationary = np.hypot(np.diff(x), np.diff(y)) <= self.stop_max_speed * np.diff(timestamp)
+        starts, ends, values = run_length_encode(stationary)
+        cumulative_x = np.concatenate(([0.0], np.cumsum(x)))
+        cumulative_y = np.concatenate(([0.0], np.cumsum(y)))
+        last = len(x) - 1
+
+        if not stationary[0]:
+            self.close_stop(first_index, timestamp[0])
+
+        for start, end in zip(starts[values], ends[values] + 1):
+            if start == 0 and self.open_stop is not None:
+                # Continues the stop left open by the previous batch (sample 0 is already counted)
+                stop = self.open_stop
+                stop[2] += cumulative_x[end + 1] - cumulative_x[1]
+                stop[3] += cumulative_y[end + 1] - cumulative_y[1]
+                stop[4] += end
+            else:
+                stop = [first_index + start, timestamp[start], cumulative_x[end + 1] - cumulative_x[start],
+                        cumulative_y[end + 1] - cumulative_y[start], end - start + 1]
+            self.open_stop = stop
+            if end < last:
+                self.close_stop(first_index + end, timestamp[end])
+
+    def update(self, new_columns):
+        # new_columns: topic -> columns holding only messages newer than the previous update.
+        # GPS goes first so samples in the same batch can be placed on the new fixes.
+        for columns in new_columns.values():
+            if len(columns['t']) and (self.first_t is None or columns['t'][0] < self.first_t):
+                self.first_t = int(columns['t'][0])
+
+        if gps_topic in new_columns:
+            self.update_gps(new_columns[gps_topic])
+        if uvc_topic in new_columns:
+            self.update_payload(new_columns[uvc_topic])
+        for topic in (joystick_topic, plc_feedback_topic):
+            if topic in new_columns and len(new_columns[topic]['t']):
+                pending = self.pending.get(topic)
+                columns = new_columns[topic]
+                if pending is not None:
+                    columns = {column: np.concatenate((pending[column], values)) for column, values in columns.items()}
+                self.pending[topic] = columns
+        self.place_pending()
+
+    def finish(self):
+        # End of the bag: samples after the last fix have nothing nearer than it
+        self.place_pending(final=True)
+
+    def place_pending(self, final=False):
+        if self.fixes is None:
+            return
+        last_t = self.fixes[0][-1]
+        for topic, update in ((joystick_topic, self.update_mode), (plc_feedback_topic, self.update_plc)):
+            columns = self.pending.pop(topic, None)
+            if columns is None:
+                continue
+            if topic == plc_feedback_topic and self.json_map is None:
+                continue
+            # Only samples up to the newest fix can be placed on their nearest fix yet
+            ready = len(columns['t']) if final else np.searchsorted(columns['t'], last_t, side='right')
+            if ready:
+                update({column: values[:ready] for column, values in columns.items()})
+            if ready < len(columns['t']):
+                self.pending[topic] = {column: values[ready:] for column, values in columns.items()}
+
+    def update_gps(self, columns):
+        if len(columns['t']) == 0:
+            return
+        x, y, _ = GPSDataProcessor.gps_array_to_meters(self.datum['longitude'], self.datum['latitude'], columns['longitude'], columns['latitude'], columns['stamp'])
+
+        if self.json_map is not None:
+            cross_track, _, _ = self.json_map.cross_track_engine().query(x, y)
+            self.cross_track['sum_abs'] += np.abs(cross_track).sum()
+            self.cross_track['sum_squares'] += (cross_track**2).sum()
+            self.cross_track['max_abs'] = max(self.cross_track['max_abs'], np.abs(cross_track).max())
+            self.cross_track['count'] += len(cross_track)
+
+        previous_timestamp = self.last_timestamp if self.last_fix is not None else None
+        if self.first_stamp is None:
+            self.first_stamp = int(columns['stamp'][0])
+        self.last_stamp = int(columns['stamp'][-1])
 
-    #Distance SUMMARY
-    print("\n__________________________\n")
-    print("\nDistance Summary\n")
+        # Prepend the previous fix so the step across the batch boundary is counted
+        t = np.asarray(columns['t'], dtype=np.int64)
+        timestamp = (np.asarray(columns['stamp'], dtype=np.int64) - self.first_stamp) / 1e9
+        first_index = self.fix_count
+        if self.last_fix is not None:
+            t = np.concatenate(([self.last_fix[0]], t))
+            x = np.concatenate(([self.last_fix[1]], x))
+            y = np.concatenate(([self.last_fix[2]], y))
+            timestamp = np.concatenate(([previous_timestamp], timestamp))
+            first_index -= 1
+        self.total_distance += np.hypot(np.diff(x), np.diff(y)).sum()
+        self.update_stops(x, y, timestamp, first_index)
+        self.fix_count += len(columns['t'])
+        self.last_fix = (int(t[-1]), x[-1], y[-1])
+        self.fixes = (t, x, y)
+
+    def fix_positions(self, t):
+        # Position of the fix nearest in time to each sample. Pending samples are newer than every
+        # fix before the latest GPS batch, so that batch (with the fix carried over from the batch
+        # before it) holds the nearest fix for all of them.
+        fix_t, fix_x, fix_y = self.fixes
+        nearest = align_nearest(t, fix_t)
+        return fix_x[nearest], fix_y[nearest]
+
+    def update_mode(self, columns):
+        t = np.asarray(columns['t'], dtype=np.int64)
+        modes = columns['data'].astype(bool)
+        x, y = self.fix_positions(t)
+        if self.last_mode is not None:
+            t = np.concatenate(([self.last_mode[0]], t))
+            x = np.concatenate(([self.last_mode[1]], x))
+            y = np.concatenate(([self.last_mode[2]], y))
+            modes = np.concatenate(([self.last_mode[3]], modes))
+
+        # Same as merge_dataframes: samples that did not move are dropped
+        keep = np.ones(len(t), dtype=bool)
+        keep[1:] = (np.diff(x) != 0) | (np.diff(y) != 0)
+        t, x, y, modes = t[keep], x[keep], y[keep], modes[keep]
+
+        # Each interval counts towards the mode of the sample it starts from
+        time_diff = np.diff(t) / 1e9
+        distance = np.hypot(np.diff(x), np.diff(y))
+        for mode in (True, False):
+            selected = modes[:-1] == mode
+            self.mode_time[mode] += time_diff[selected].sum()
+            self.mode_distance[mode] += distance[selected].sum()
+        self.last_mode = (int(t[-1]), x[-1], y[-1], bool(modes[-1]))
+
+    def update_payload(self, columns):
+        t = np.asarray(columns['t'], dtype=np.int64)
+        if len(t) == 0:
+            return
+        states = columns['data'].astype(str)
+        if self.last_payload is not None:
+            t = np.concatenate(([self.last_payload[0]], t))
+            states = np.concatenate(([self.last_payload[1]], states))
+
+        # Time until the next message counts towards the state being reported
+        time_diff = np.diff(t) / 1e9
+        for state in np.unique(states[:-1]):
+            self.payload_time[str(state)] = self.payload_time.get(str(state), 0.0) + time_diff[states[:-1] == state].sum()
+        self.last_payload = (int(t[-1]), str(states[-1]))
+
+    def update_plc(self, columns):
+        x, y = self.fix_positions(np.asarray(columns['t'], dtype=np.int64))
+
+        # Same as PLCFeedbackDataProcessor.merge_dataframes: only the first sample at each position counts
+        keep = ~pd.DataFrame({'x': x, 'y': y}).duplicated().to_numpy()
+        for i in np.flatnonzero(keep):
+            position = (x[i], y[i])
+            if position in self.plc_seen:
+                keep[i] = False
+            else:
+                self.plc_seen.add(position)
+        if not keep.any():
+            return
+        positions = np.column_stack((x[keep], y[keep]))
+
+        # Planned positions and treatment area come from the nearest map points, as in PLCFeedbackDataProcessor
+        map_index = self.json_map.spatial_index()
+        _, wing_boom_indices = map_index.wing_boom_tree.query(positions, workers=-1)
+        _, point_indices = map_index.points_tree.query(positions, workers=-1)
+        treatment_area = self.json_map.points['treatment_area'][point_indices]
+        planned = self.json_map.wing_boom_position
+        differences = {name: np.abs(np.asarray(columns[measured], dtype=float)[keep] - planned[planned_column][wing_boom_indices])
+                       for name, (measured, planned_column) in PLC_DIFFERENCES.items()}
+        for name, diff in differences.items():
+            valid = ~np.isnan(diff)
+            self.plc_sums[name] += diff[valid].sum()
+            self.plc_counts[name] += int(valid.sum())
+
+        # Treatment area runs continue across batches, like the segment index of PLCDataLogger
+        starts, ends, in_treatment_area = run_length_encode(treatment_area)
+        for start, end, value in zip(starts, ends, in_treatment_area):
+            sums = {name: np.nansum(diff[start:end + 1]) for name, diff in differences.items()}
+            counts = {name: int((~np.isnan(diff[start:end + 1])).sum()) for name, diff in differences.items()}
+            if start == 0 and self.open_run is not None and self.open_run[0] == value:
+                run = self.open_run
+                run[2] = self.plc_row_count + end
+                for name in PLC_DIFFERENCES:
+                    run[3][name] += sums[name]
+                    run[4][name] += counts[name]
+            else:
+                if self.open_run is not None:
+                    self.plc_runs.append(self.open_run)
+                self.open_run = [bool(value), self.plc_row_count + start, self.plc_row_count + end, sums, counts]
+        self.plc_row_count += int(keep.sum())
+
+    def add_message(self, topic, t, *values):
+        # One message as a one-row batch, so single messages are counted exactly like batches
+        columns = {'t': np.array([t], dtype=np.int64)}
+        for (column, dtype, getter), value in zip(TOPIC_COLUMNS[topic], values):
+            columns[column] = np.array([value], dtype=dtype)
+        self.update({topic: columns})
+
+    def add_fix(self, t, stamp, latitude, longitude):
+        self.add_message(gps_topic, t, stamp, latitude, longitude)
+
+    def add_joystick(self, t, joystick_control):
+        self.add_message(joystick_topic, t, joystick_control)
+
+    def add_uvc(self, t, uvc_light_status):
+        self.add_message(uvc_topic, t, uvc_light_status)
+
+    def add_plc(self, t, boom_position, left_wing_position, right_wing_position):
+        self.add_message(plc_feedback_topic, t, boom_position, left_wing_position, right_wing_position)
+
+    def summary(self):
+        # The figures collect_summary gives that do not come from the map alone, under the same keys
+        manual_minutes = self.mode_time[True] / 60
+        auto_minutes = self.mode_time[False] / 60
+        total_minutes = manual_minutes + auto_minutes
+        percent_time_in_auto = auto_minutes / total_minutes * 100 if total_minutes else 0
+        count = self.cross_track['count']
+        stops = self.stops
+        segments = self.plc_segments
+        differences = self.plc_differences
+        return {
+            'run_start': self.first_t / 1e9 if self.first_t is not None else None,
+            'total_runtime': self.total_runtime,
+            'total_distance': self.total_distance,
+            'stops': len(stops),
+            'stop_time': stops['duration'].sum(),
+            'cross_track_mean_abs': self.cross_track['sum_abs'] / count if count else 0.0,
+            'cross_track_rms': math.sqrt(self.cross_track['sum_squares'] / count) if count else 0.0,
+            'cross_track_max_abs': self.cross_track['max_abs'],
+            'time_in_manual_minutes': manual_minutes,
+            'time_in_auto_minutes': auto_minutes,
+            'distance_in_manual': self.mode_distance[True],
+            'distance_in_auto': self.mode_distance[False],
+            'percent_time_in_manual': 100 - percent_time_in_auto if total_minutes else 0,
+            'percent_time_in_auto': percent_time_in_auto,
+            'lights_off_seconds': self.payload_time.get('000', 0.0),
+            'lights_on_seconds': self.payload_time.get('111', 0.0),
+            'plc_rows': int((segments['kind'] == 'row').sum()),
+            'plc_turns': int((segments['kind'] == 'turn').sum()),
+            'plc_boom_diff': differences['boom'],
+            'plc_left_wing_diff': differences['left_wing'],
+            'plc_right_wing_diff': differences['right_wing'],
+        }
+
+    def print_totals(self):
+        manual_minutes = self.mode_time[True] / 60
+        auto_minutes = self.mode_time[False] / 60
+        print(f"Total Runtime: {round(self.total_runtime, 2)}")
+        print(f"Total Distance Traveled: {round(self.total_distance, 2)} meters")
+        print(f"Distance in manual mode: {round(self.mode_distance[True], 2)} meters")
+        print(f"Distance in auto mode: {round(self.mode_distance[False], 2)} meters")
+        print(f"Time in auto mode: {round(auto_minutes, 2)} minutes")
+        print(f"Time in manual mode: {round(manual_minutes, 2)} minutes")
+        print(f"Total time lights were off: {round(self.payload_time.get('000', 0.0), 2)} seconds")
+        print(f"Total time lights were on: {round(self.payload_time.get('111', 0.0), 2)} seconds")
+        stops = self.stops
+        print(f"Stops: {len(stops)}, {round(stops['duration'].sum(), 2)} seconds stopped")
+        differences = self.plc_differences
+        if self.plc_row_count:
+            print(f"Average differences - Boom: {differences['boom']}, Left Wing: {differences['left_wing']}, Right Wing: {differences['right_wing']}")
+
+def follow(context=None, interval=5.0, iterations=None):
+    # Tailing mode: summarise what is already in the bag, then poll for new messages and
+    # update the running totals with only those. Works on a bag that is still being recorded
+    # (.bag.active), whose chunks are read as the recorder flushes them.
+    if context is None:
+        context = ProcessingContext(bag_path, json_map, [gps_topic, joystick_topic, uvc_topic, plc_feedback_topic], use_cache=False)
+
+    totals = RunningTotals(context.datum, context.json_map)
+    totals.update(context.bag_session.get_columns(context.topics))
+    totals.print_totals()
+
+    count = 0
+    while iterations is None or count < iterations:
+        time.sleep(interval)
+        count += 1
+        new_columns = context.bag_session.refresh()
+        if not any(len(columns['t']) for columns in new_columns.values()):
+            continue
+        print("\n__________________________\n")
+        totals.update(new_columns)
+        totals.print_totals()
+    return totals
+
+def report_sections(context):
+    # Every summary main() prints, as structured sections (title, text lines and an optional table)
+    # so the same results can be printed or laid out in a PDF without running this script again
+    gps_logger, joystick_logger, uvc_logger, json_logger, plc_logger, cross_track_logger = create_loggers(context)
+    time_in_manual_minutes, time_in_auto_minutes, distance_in_manual, distance_in_auto, percent_time_in_manual, percent_time_in_auto = joystick_logger.calculate_distances_and_times()
+    total_runtime = gps_logger.calculate_runtime()
     total_distance = gps_logger.calculate_distances()
-    print(f"Total Distance Traveled: {round(total_distance, 2)} meters")
+    stops = gps_logger.find_stops()
 
-    #Stop SUMMARY
-    print("\n__________________________\n")
-    print("\nStop Summary\n")
-    print(gps_logger.find_stops())
+    sections = [
+        {'title': "JSON Distance Summary", 'separator': False, 'lines': json_logger.total_distance_lines()},
+        {'title': "JSON Ideal Time Summary", 'separator': False, 'lines': json_logger.ideal_time_lines()},
+        {'title': "Runtime Summary", 'lines': [f"Total Runtime: {round(total_runtime, 2)}"]},
+        {'title': "Distance Summary", 'lines': [f"Total Distance Traveled: {round(total_distance, 2)} meters"]},
+        {'title': "Cross-Track Summary", 'lines': cross_track_logger.cross_track_lines()},
+        {'title': "Stop Summary", 'lines': str(stops).splitlines(), 'table': stops},
+        {'title': "Mode Summary", 'lines': [
+            f"Distance in manual mode: {round(distance_in_manual, 2)} meters",
+            f"Distance in auto mode: {round(distance_in_auto, 2)} meters",
+            f"Total distance: {round(distance_in_manual + distance_in_auto, 2)} meters",
+            f"Time in auto mode: {round(time_in_auto_minutes, 2)} minutes",
+            f"Time in manual mode: {round(time_in_manual_minutes, 2)} minutes",
+            f"Total time: {round(time_in_manual_minutes + time_in_auto_minutes, 2)} minutes",
+            f"Percentage of time in manual mode: {round(percent_time_in_manual, 2)}%",
+            f"Percentage of time in auto mode: {round(percent_time_in_auto, 2)}%",
+        ]},
+        {'title': "Payload Summary", 'lines': uvc_logger.payload_runtime_lines() + uvc_logger.payload_distance_lines() + uvc_logger.lamp_breakdown_lines()},
+        {'title': "PLC Summary", 'lines': [line for kind in ['row', 'turn', 'start_path', 'end_path'] for line in plc_logger.segment_lines(kind)]},
+    ]
+    for section in sections:
+        section.setdefault('separator', True)
+        section.setdefault('table', None)
+    return sections
 
-    #Mode SUMMARY
-    
-    print("\n__________________________\n")
-    print(f"\nMode Summary\n")
-    print(f"Distance in manual mode: {round(distance_in_manual, 2)} meters")
-    print(f"Distance in auto mode: {round(distance_in_auto, 2)} meters")
-    print(f"Total distance: {round(distance_in_manual + distance_in_auto, 2)} meters")
-    print(f"Time in auto mode: {round(time_in_auto_minutes, 2)} minutes")
-    print(f"Time in manual mode: {round(time_in_manual_minutes, 2)} minutes")
-    print(f"Total time: {round(time_in_manual_minutes + time_in_auto_minutes, 2)} minutes")
-    print(f"Percentage of time in manual mode: {round(percent_time_in_manual, 2)}%")
-    print(f"Percentage of time in auto mode: {round(percent_time_in_auto, 2)}%")
-
-    #Payload SUMMARY
-    print("\n__________________________\n")
-    print("\nPayload Summary\n")
-    uvc_logger.payload_runtime()
-    uvc_logger.payload_distance()
-    
-    print("\n__________________________\n")
-    print("\nPLC Summary\n")
-    plc_logger.print_rows()
-    plc_logger.print_turns()
-    plc_logger.print_start_path()
-    plc_logger.print_end_path()
+def print_report(sections):
+    for section in sections:
+        if section['separator']:
+            print("\n__________________________\n")
+        print(f"\n{section['title']}\n")
+        for line in section['lines']:
+            print(line)
+
+def process_in_windows(bag_path=bag_path, json_file_path=json_map, window=60.0, topics=None):
+    # Out-of-core summary for very long bags: the bag is decoded one time window at a time and
+    # each window only updates the running totals, which carry the state across window boundaries
+    if topics is None:
+        topics = [gps_topic, joystick_topic, uvc_topic, plc_feedback_topic]
+    json_processor = JSONProcessor(json_file_path)
+    session = BagSession(bag_path, [], use_cache=False)
+
+    totals = RunningTotals(json_processor.datum, json_processor)
+    for columns in session.read_windows(topics, window):
+        totals.update(columns)
+    totals.finish()
+    return totals
+
+def main(context=None):
+
+    # The context reads every topic once and shares the map and bag between all processors
+    if context is None:
+        context = ProcessingContext(bag_path, json_map, [gps_topic, joystick_topic, uvc_topic, plc_feedback_topic])
+
+    print_report(report_sections(context))
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    if '--follow' in sys.argv:
+        follow()
+    elif '--windowed' in sys.argv:
+        process_in_windows().print_totals()
+    else:
+        main()
\ No newline at end of file
@@ -0,0 +1,136 @@
+#!/Library/Frameworks/Python.framework/Versions/3.12/bin/python3
+
+import time
+import argparse
+import threading
+from collections import deque
+import numpy as np
+import rosbag
+from topic_subscriber import JSONProcessor
+from topic_subscriber import TOPIC_COLUMNS
+from data_processor import RunningTotals
+from data_processor import gps_topic, joystick_topic, uvc_topic, plc_feedback_topic
+from data_processor import bag_path, json_map
+
+# Message type of every topic we subscribe to, resolved through roslib when going live
+TOPIC_TYPES = {
+    gps_topic: 'sensor_msgs/NavSatFix',
+    joystick_topic: 'std_msgs/Bool',
+    uvc_topic: 'std_msgs/String',
+    plc_feedback_topic: 'tric_navigation/PLC_Feedback',
+}
+
+class LiveSubscriber:
+    # Online counterpart of BagSession. Messages arrive through callback(), the newest
+    # `buffer_size` of each topic are kept in ring buffers and the running totals are
+    # updated per message, so memory and work per message stay constant however long it runs.
+
+    def __init__(self, json_file_path, topics=None, buffer_size=10000):
+        self.topics = list(topics) if topics is not None else list(TOPIC_TYPES)
+        self.json_map = JSONProcessor(json_file_path)
+        self.totals = RunningTotals(self.json_map.datum, self.json_map)
+        self.buffers = {topic: deque(maxlen=buffer_size) for topic in self.topics}
+        self.message_count = 0
+        # rospy calls back from one thread per topic
+        self.lock = threading.Lock()
+        self.subscribers = []
+
+    def callback(self, topic, msg, t):
+        # t is the receive time in ns, like the 't' column read from bags
+        row = (t,) + tuple(getter(msg) for column, dtype, getter in TOPIC_COLUMNS[topic])
+
+        with self.lock:
+            self.buffers[topic].append(row)
+            self.message_count += 1
+            if topic == gps_topic:
+                self.totals.add_fix(*row)
+            elif topic == joystick_topic:
+                self.totals.add_joystick(*row)
+            elif topic == uvc_topic:
+                self.totals.add_uvc(*row)
+            elif topic == plc_feedback_topic:
+                self.totals.add_plc(*row)
+
+    def buffered_columns(self, topic):
+        # The ring buffer in the same column layout BagSession uses, for the batch processors and plots
+        with self.lock:
+            rows = list(self.buffers[topic])
+
+        names = ['t'] + [c[0] for c in TOPIC_COLUMNS[topic]]
+        dtypes = ['int64'] + [c[1] for c in TOPIC_COLUMNS[topic]]
+        values = list(zip(*rows)) if rows else [[] for _ in names]
+        return {name: np.asarray(column, dtype=dtype) for name, dtype, column in zip(names, dtypes, values)}
+
+    def subscribe(self):
+        # Imported here so offline use and bag replay work without a ROS install
+        import rospy
+        import roslib.message
+
+        for topic in self.topics:
+            message_class = roslib.message.get_message_class(TOPIC_TYPES[topic])
+            self.subscribers.append(rospy.Subscriber(topic, message_class, self.receive, callback_args=topic, queue_size=100))
+
+    def receive(self, msg, topic):
+        import rospy
+        self.callback(topic, msg, rospy.get_rostime().to_nsec())
+
+    def unsubscribe(self):
+        for subscriber in self.subscribers:
+            subscriber.unregister()
+        self.subscribers = []
+
+class BagReplayPublisher:
+    # Local stand-in for the robot: replays a recorded bag into a subscriber's callback,
+    # as fast as possible or at `rate` times the recorded speed
+
+    def __init__(self, bag_path, rate=None):
+        self.bag_path = bag_path
+        self.rate = rate
+
+    def run(self, subscriber):
+        bag = rosbag.Bag(self.bag_path)
+        first_t = None
+        started = time.monotonic()
+
+        for topic, msg, t in bag.read_messages(topics=subscriber.topics):
+            t = t.to_nsec()
+            if self.rate:
+                if first_t is None:
+                    first_t = t
+                delay = (t - first_t) / 1e9 / self.rate - (time.monotonic() - started)
+                if delay > 0:
+                    time.sleep(delay)
+            subscriber.callback(topic, msg, t)
+
+        # The recording is over, so samples after its last fix go on that fix
+        with subscriber.lock:
+            subscriber.totals.finish()
+        bag.close()
+        return subscriber
+
+def main():
+    parser = argparse.ArgumentParser(description="Keep the run summary up to date from live topics.")
+    parser.add_argument('--map', default=json_map, help="JSON map of the field being run")
+    parser.add_argument('--replay', nargs='?', const=bag_path, help="replay a bag instead of subscribing to ROS")
+    parser.add_argument('--rate', type=float, help="replay speed relative to the recording (default: as fast as possible)")
+    parser.add_argument('--interval', type=float, default=5.0, help="seconds between printed summaries")
+    args = parser.parse_args()
+
+    subscriber = LiveSubscriber(args.map)
+
+    if args.replay:
+        BagReplayPublisher(args.replay, args.rate).run(subscriber)
+        subscriber.totals.print_totals()
+        return
+
+    import rospy
+    rospy.init_node('data_vis_live', anonymous=True)
+    subscriber.subscribe()
+    while not rospy.is_shutdown():
+        rospy.sleep(args.interval)
+        print("\n__________________________\n")
+        with subscriber.lock:
+            subscriber.totals.print_totals()
+
+if __name__ == "__main__":
+    main()
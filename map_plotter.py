@@ -1,7 +1,9 @@
 #!/Library/Frameworks/Python.framework/Versions/3.12/bin/python3
 
-from topic_subscriber import JSONProcessor, GPSDataProcessor
+from topic_subscriber import ProcessingContext, GPSDataProcessor, MAP_SEGMENT_KINDS
 import matplotlib.pyplot as plt
+import numpy as np
+import sys
 
 bag_path = 'e0_rosbags/2023-12-06-15-32-37.bag'
 gps_topic = '/tric_navigation/gps/head_data'
@@ -13,12 +15,43 @@ output_file = 'output.png'  # Output file for the plot
 
 
 class MapPlotter:
-    def __init__(self, json_processor, gps_data_processor):
+    # fast=True draws a level-of-detail version: dense layers are reduced to one point per
+    # output pixel, the GPS track becomes a single line and both are rasterised, so long
+    # runs plot quickly and stay small in vector outputs such as PDF
+
+    def __init__(self, json_processor, gps_data_processor, fast=False, dpi=100):
         self.json_processor = json_processor
         self.gps_data_processor = gps_data_processor
+        self.fast = fast
+        self.dpi = dpi
+
+    def pixel_cells(self, x, y, extent, size):
+        # Index of the output pixel each point falls in
+        (x_min, x_max, y_min, y_max), (width, height) = extent, size
+        column = ((x - x_min) / max(x_max - x_min, 1e-9) * (width - 1)).astype(np.int64)
+        row = ((y - y_min) / max(y_max - y_min, 1e-9) * (height - 1)).astype(np.int64)
+        return row * width + column
+
+    def decimate_points(self, x, y, extent, size):
+        # One point per occupied pixel; order does not matter for a scatter layer
+        if len(x) == 0:
+            return x, y
+        _, keep = np.unique(self.pixel_cells(x, y, extent, size), return_index=True)
+        keep.sort()
+        return x[keep], y[keep]
 
-    def plot(self, output_file):
-        fig, ax = plt.subplots()
+    def decimate_track(self, x, y, extent, size):
+        # Drop consecutive fixes that stay within the same pixel, keeping the path order
+        if len(x) == 0:
+            return x, y
+        cells = self.pixel_cells(x, y, extent, size)
+        keep = np.ones(len(cells), dtype=bool)
+        keep[1:] = cells[1:] != cells[:-1]
+        keep[-1] = True
+        return x[keep], y[keep]
+
+    def plot(self, output_file, format='png'):
+        fig, ax = plt.subplots(dpi=self.dpi)
 
         # Define colors, sizes, and markers for each key
         colors = {
@@ -43,22 +76,42 @@ class MapPlotter:
             'datum': 'x'
         }
 
-        # Plot data
-        data = self.json_processor.data
-        for key, points in data.items():
-            if key == 'wing_boom_pos':  # Skip 'wing_boom_pos'
-                continue
-            ax.scatter([point['x'] for point in points], [point['y'] for point in points], 
-                        color=colors[key], s=sizes[key], marker=markers[key], label=key.capitalize())
+        layers = {key: self.json_processor.segment_arrays(kind) for key, kind in MAP_SEGMENT_KINDS.items()}
+        gps_df = self.gps_data_processor.create_dataframe()
+        gps_x, gps_y = gps_df['x'].to_numpy(), gps_df['y'].to_numpy()
+
+        if self.fast:
+            # Level of detail follows the output size: one cell per pixel of the figure
+            all_x = np.concatenate([x for x, y in layers.values()] + [gps_x, [0.0]])
+            all_y = np.concatenate([y for x, y in layers.values()] + [gps_y, [0.0]])
+            extent = (all_x.min(), all_x.max(), all_y.min(), all_y.max())
+            size = tuple(int(v) for v in fig.get_size_inches() * fig.dpi)
+            layers = {key: self.decimate_points(np.asarray(x), np.asarray(y), extent, size) for key, (x, y) in layers.items()}
+            gps_x, gps_y = self.decimate_track(gps_x, gps_y, extent, size)
+
+        # Plot map segments straight from the map's point arrays
+        for key, (x, y) in layers.items():
+            ax.scatter(x, y, color=colors[key], s=sizes[key], marker=markers[key], label=key.capitalize(), rasterized=self.fast)
+        ax.scatter([0], [0], color=colors['datum'], s=sizes['datum'], marker=markers['datum'], label='Datum')
 
         # Plot GPS data
-        gps_df = self.gps_data_processor.create_dataframe()
-        ax.scatter(gps_df['x'], gps_df['y'], color='black', s=1, marker='_', label='GPS Data')
+        if self.fast:
+            ax.plot(gps_x, gps_y, color='black', linewidth=0.5, label='GPS Data', rasterized=True)
+        else:
+            ax.scatter(gps_x, gps_y, color='black', s=1, marker='_', label='GPS Data')
 
         ax.legend()
-        plt.savefig(output_file, format='png')  # Save the plot as a PNG file
+        fig.savefig(output_file, format=format)  # Save the plot (a path or a file-like buffer)
+        # Close the figure so repeated plots in one process don't pile up
+        plt.close(fig)
+
+def main(context=None):
+    if context is None:
+        context = ProcessingContext(bag_path, json_map, [gps_topic])
+
+    gps_data_processor = GPSDataProcessor(context, [gps_topic])
+    plotter = MapPlotter(context.json_map, gps_data_processor, fast='--fast' in sys.argv)
+    plotter.plot(output_file)
 
-json_processor = JSONProcessor(json_map)
-gps_data_processor = GPSDataProcessor(bag_path, [gps_topic])
-plotter = MapPlotter(json_processor, gps_data_processor)
-plotter.plot(output_file)
\ No newline at end of file
+if __name__ == "__main__":
+    main()
\ No newline at end of file
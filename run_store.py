@@ -0,0 +1,170 @@
+#!/Library/Frameworks/Python.framework/Versions/3.12/bin/python3
+
+import os
+import sqlite3
+import argparse
+from datetime import datetime, timezone
+import pandas as pd
+
+store_file = 'runs.db'
+
+# Per-run metrics kept in the runs table, named as in collect_summary
+RUN_METRICS = [
+    'total_runtime', 'total_distance',
+    'time_in_manual_minutes', 'time_in_auto_minutes', 'distance_in_manual', 'distance_in_auto',
+    'percent_time_in_manual', 'percent_time_in_auto',
+    'stops', 'stop_time',
+    'lights_off_seconds', 'lights_on_seconds',
+    'cross_track_mean_abs', 'cross_track_rms', 'cross_track_max_abs',
+    'plc_rows', 'plc_turns', 'plc_boom_diff', 'plc_left_wing_diff', 'plc_right_wing_diff',
+]
+
+COUNT_METRICS = {'stops', 'plc_rows', 'plc_turns'}
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    bag_path TEXT UNIQUE NOT NULL,
+    json_map TEXT,
+    machine TEXT,
+    run_date TEXT,
+    run_start REAL,
+    {', '.join(f"{metric} {'INTEGER' if metric in COUNT_METRICS else 'REAL'}" for metric in RUN_METRICS)}
+);
+CREATE INDEX IF NOT EXISTS runs_date ON runs (run_date);
+CREATE INDEX IF NOT EXISTS runs_machine_date ON runs (machine, run_date);
+CREATE INDEX IF NOT EXISTS runs_map_date ON runs (json_map, run_date);
+
+CREATE TABLE IF NOT EXISTS segments (
+    run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    kind TEXT,
+    segment_index INTEGER,
+    start INTEGER,
+    stop INTEGER,
+    length INTEGER,
+    boom_diff REAL,
+    left_wing_diff REAL,
+    right_wing_diff REAL
+);
+CREATE INDEX IF NOT EXISTS segments_run ON segments (run_id, kind);
+
+CREATE TABLE IF NOT EXISTS stops (
+    run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    start_time REAL,
+    end_time REAL,
+    duration REAL,
+    x REAL,
+    y REAL
+);
+CREATE INDEX IF NOT EXISTS stops_run ON stops (run_id);
+"""
+
+def machine_name(bag_path):
+    # Bags are kept per machine, e.g. e0_rosbags/ holds the bags of machine e0
+    folder = os.path.basename(os.path.dirname(os.path.abspath(bag_path)))
+    return folder[:-len('_rosbags')] if folder.endswith('_rosbags') else folder
+
+class RunStore:
+    # Local SQLite store of per-run, per-segment and per-stop metrics. Season-level questions
+    # are answered from the indexed tables without opening a single bag.
+
+    def __init__(self, path=store_file):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def store_run(self, summary, segments=None, stops=None, machine=None):
+        # Re-storing a bag replaces its earlier results
+        run_start = summary.get('run_start')
+        run_date = datetime.fromtimestamp(run_start, timezone.utc).date().isoformat() if run_start is not None else None
+        row = {
+            'bag_path': summary['bag_path'],
+            'json_map': summary.get('json_map'),
+            'machine': machine if machine is not None else machine_name(summary['bag_path']),
+            'run_date': run_date,
+            'run_start': run_start,
+            **{metric: summary.get(metric) for metric in RUN_METRICS}
+        }
+        row = {key: value.item() if hasattr(value, 'item') else value for key, value in row.items()}
+
+        with self.connection:
+            self.connection.execute("DELETE FROM runs WHERE bag_path = ?", (row['bag_path'],))
+            cursor = self.connection.execute(
+                f"INSERT INTO runs ({', '.join(row)}) VALUES ({', '.join('?' * len(row))})", list(row.values()))
+            run_id = cursor.lastrowid
+
+            if segments is not None and len(segments):
+                segments = segments.assign(segment_index=segments.groupby('kind').cumcount() + 1)
+                columns = ['kind', 'segment_index', 'start', 'stop', 'length', 'boom_diff', 'left_wing_diff', 'right_wing_diff']
+                self.connection.executemany(
+                    f"INSERT INTO segments (run_id, {', '.join(columns)}) VALUES (?, {', '.join('?' * len(columns))})",
+                    [(run_id, *values) for values in segments[columns].astype(object).itertuples(index=False)])
+
+            if stops is not None and len(stops):
+                columns = ['start_time', 'end_time', 'duration', 'x', 'y']
+                self.connection.executemany(
+                    f"INSERT INTO stops (run_id, {', '.join(columns)}) VALUES (?, {', '.join('?' * len(columns))})",
+                    [(run_id, *values) for values in stops[columns].astype(object).itertuples(index=False)])
+        return run_id
+
+    def query(self, sql, params=()):
+        return pd.read_sql_query(sql, self.connection, params=params)
+
+    def date_filter(self, since=None, until=None, machine=None, json_map=None):
+        # WHERE clause over the indexed run columns; dates are 'YYYY-MM-DD', both ends inclusive
+        conditions, params = [], []
+        for column, operator, value in [('run_date', '>=', since), ('run_date', '<=', until),
+                                        ('machine', '=', machine), ('json_map', '=', json_map)]:
+            if value is not None:
+                conditions.append(f"runs.{column} {operator} ?")
+                params.append(value)
+        return (" WHERE " + " AND ".join(conditions) if conditions else ""), params
+
+    def average_auto_percent_per_map(self, since=None, until=None, machine=None):
+        where, params = self.date_filter(since, until, machine)
+        return self.query(
+            f"SELECT json_map, COUNT(*) AS runs, AVG(percent_time_in_auto) AS average_auto_percent "
+            f"FROM runs{where} GROUP BY json_map ORDER BY json_map", params)
+
+    def machine_totals(self, since=None, until=None, json_map=None):
+        where, params = self.date_filter(since, until, json_map=json_map)
+        return self.query(
+            f"SELECT machine, COUNT(*) AS runs, SUM(total_runtime) AS runtime, SUM(total_distance) AS distance, "
+            f"SUM(lights_on_seconds) AS lights_on_seconds, SUM(stops) AS stops, SUM(stop_time) AS stop_time "
+            f"FROM runs{where} GROUP BY machine ORDER BY machine", params)
+
+    def segment_errors(self, kind='row', since=None, until=None, machine=None):
+        # Mean PLC boom/wing differences per map for one kind of segment
+        where, params = self.date_filter(since, until, machine)
+        where = (where + " AND" if where else " WHERE") + " segments.kind = ?"
+        return self.query(
+            f"SELECT runs.json_map, COUNT(*) AS segments, AVG(segments.boom_diff) AS boom_diff, "
+            f"AVG(segments.left_wing_diff) AS left_wing_diff, AVG(segments.right_wing_diff) AS right_wing_diff "
+            f"FROM segments JOIN runs ON runs.id = segments.run_id{where} GROUP BY runs.json_map ORDER BY runs.json_map",
+            params + [kind])
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the stored run metrics.")
+    parser.add_argument('report', choices=['auto-by-map', 'machines', 'row-errors'], help="which summary to print")
+    parser.add_argument('--store', default=store_file, help="SQLite file written by batch_processor.py --store")
+    parser.add_argument('--since', help="first run date to include (YYYY-MM-DD)")
+    parser.add_argument('--until', help="last run date to include (YYYY-MM-DD)")
+    parser.add_argument('--machine', help="only runs of this machine")
+    args = parser.parse_args()
+
+    store = RunStore(args.store)
+    if args.report == 'auto-by-map':
+        result = store.average_auto_percent_per_map(args.since, args.until, args.machine)
+    elif args.report == 'machines':
+        result = store.machine_totals(args.since, args.until)
+    else:
+        result = store.segment_errors('row', args.since, args.until, args.machine)
+    store.close()
+    print(result.to_string(index=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,15 @@
+import os
+import sys
+
+import pytest
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_dir)
+
+@pytest.fixture
+def sample_bag():
+    return os.path.join(repo_dir, '2023-12-06-14-46-37.bag')
+
+@pytest.fixture
+def sample_map():
+    return os.path.join(repo_dir, 'testrow.json')
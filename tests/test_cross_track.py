@@ -0,0 +1,61 @@
+import numpy as np
+
+from cross_track import CrossTrackEngine
+
+def brute_force(path_x, path_y, x, y):
+    # Projection of every position onto every segment, keeping the closest
+    start = np.column_stack((path_x[:-1], path_y[:-1]))
+    vector = np.column_stack((np.diff(path_x), np.diff(path_y)))
+    length = np.hypot(vector[:, 0], vector[:, 1])
+    positions = np.column_stack((x, y))
+
+    offset = positions[:, None, :] - start[None, :, :]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        fraction = np.clip((offset * vector[None]).sum(axis=2) / length**2, 0, 1)
+    fraction = np.nan_to_num(fraction)
+    distance = np.hypot(*(offset - fraction[..., None] * vector[None]).transpose(2, 0, 1))
+
+    segment = distance.argmin(axis=1)
+    rows = np.arange(len(positions))
+    side = np.sign(vector[segment, 0] * offset[rows, segment, 1] - vector[segment, 1] * offset[rows, segment, 0])
+    cross_track = np.where(side < 0, -1, 1) * distance[rows, segment]
+    cumulative = np.concatenate(([0.0], np.cumsum(length)))
+    along_track = cumulative[segment] + fraction[rows, segment] * length[segment]
+    return cross_track, along_track, segment, np.sort(distance, axis=1)[:, :2]
+
+def test_curved_path_matches_brute_force():
+    # A winding path with uneven point spacing, and positions scattered on both sides of it
+    rng = np.random.default_rng(0)
+    s = np.sort(rng.uniform(0, 4 * np.pi, 300))
+    path_x = 5 * s
+    path_y = 10 * np.sin(s) + 0.5 * s**2
+    x = rng.uniform(path_x.min() - 5, path_x.max() + 5, 2000)
+    y = np.interp(x, path_x, path_y) + rng.uniform(-15, 15, 2000)
+
+    cross_track, along_track, segment = CrossTrackEngine(path_x, path_y).query(x, y)
+    expected_cross_track, expected_along_track, expected_segment, closest = brute_force(path_x, path_y, x, y)
+
+    np.testing.assert_allclose(cross_track, expected_cross_track, atol=1e-9)
+    np.testing.assert_allclose(along_track, expected_along_track, atol=1e-9)
+    # Past a bend the closest point can be a shared vertex, and then either segment is right
+    unique = closest[:, 1] - closest[:, 0] > 1e-9
+    assert unique.mean() > 0.5
+    np.testing.assert_array_equal(segment[unique], expected_segment[unique])
+
+def test_map_with_duplicate_points():
+    # Every point recorded twice: half the segments have zero length
+    x = np.repeat(np.arange(0.0, 50.0, 1.0), 2)
+    y = np.zeros_like(x)
+    engine = CrossTrackEngine(x, y)
+
+    assert len(engine.bucket_segment) < 10 * len(x)
+
+    cross_track, along_track, segment = engine.query([10.3, 20.0], [2.0, -1.5])
+    np.testing.assert_allclose(cross_track, [2.0, -1.5])
+    np.testing.assert_allclose(along_track, [10.3, 20.0])
+
+def test_map_of_one_repeated_point():
+    engine = CrossTrackEngine([5.0, 5.0, 5.0], [1.0, 1.0, 1.0])
+    cross_track, along_track, segment = engine.query([8.0], [5.0])
+    np.testing.assert_allclose(np.abs(cross_track), [5.0])
+    np.testing.assert_allclose(along_track, [0.0])
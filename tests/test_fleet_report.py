@@ -0,0 +1,34 @@
+import os
+import shutil
+
+import pytest
+
+pytest.importorskip('rosbag')
+pytest.importorskip('reportlab')
+from data_logger import build_fleet_reports, index_elements
+
+def test_mixed_fleet(tmp_path, sample_bag, sample_map):
+    bag_dir = tmp_path / 'e0_rosbags'
+    bag_dir.mkdir()
+    for name in ['run1.bag', 'run2.bag', 'run3.bag']:
+        shutil.copy(sample_bag, bag_dir / name)
+    (bag_dir / 'bad.bag').write_bytes(b'#ROSBAG V2.0\nnot a bag')
+    bag_paths = sorted(str(path) for path in bag_dir.iterdir())
+
+    umask = os.umask(0o022)
+    try:
+        results_df, index_path = build_fleet_reports(bag_paths, sample_map, output_dir=str(tmp_path / 'reports'), workers=2)
+    finally:
+        os.umask(umask)
+
+    statuses = dict(zip(results_df['bag_path'].map(os.path.basename), results_df['error'].isna()))
+    assert statuses == {'bad.bag': False, 'run1.bag': True, 'run2.bag': True, 'run3.bag': True}
+    assert os.path.exists(index_path)
+    for name in ['run1.pdf', 'run2.pdf', 'run3.pdf']:
+        # Written through mkstemp, but published with the mode the umask gives
+        assert os.stat(tmp_path / 'reports' / name).st_mode & 0o777 == 0o644
+
+    # The index page lists each bag with the status the run printed for it
+    table = index_elements(results_df)[1]
+    assert {row[0]: row[-1] for row in table._cellvalues[1:]} == {
+        'bad.bag': 'failed', 'run1.bag': 'done', 'run2.bag': 'done', 'run3.bag': 'done'}
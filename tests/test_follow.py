@@ -0,0 +1,59 @@
+import os
+
+import numpy as np
+import pytest
+
+rosbag = pytest.importorskip('rosbag')
+from topic_subscriber import BagSession, ProcessingContext
+from data_processor import RunningTotals, follow, gps_topic, joystick_topic, uvc_topic, plc_feedback_topic
+
+topics = [gps_topic, joystick_topic, uvc_topic, plc_feedback_topic]
+
+def flush(bag):
+    # Closes the open chunk and pushes it to disk, as the recorder does while it runs
+    bag.flush()
+    bag._file.flush()
+
+def recorded_messages(sample_bag):
+    bag = rosbag.Bag(sample_bag)
+    messages = list(bag.read_messages(topics=topics, raw=True))
+    bag.close()
+    return messages
+
+def test_follow_bag_while_recording(tmp_path, sample_bag, sample_map):
+    messages = recorded_messages(sample_bag)
+    half = len(messages) // 2
+    active_path = str(tmp_path / 'run.bag.active')
+
+    recorder = rosbag.Bag(active_path, 'w', chunk_threshold=4096)
+    for topic, msg, t in messages[:half]:
+        recorder.write(topic, msg, t, raw=True)
+    flush(recorder)
+
+    # The bag has no index yet, but everything flushed so far is read
+    context = ProcessingContext(active_path, sample_map, topics, use_cache=False)
+    loaded = sum(len(context.bag_session.columns[topic]['t']) for topic in topics)
+    assert loaded == half
+
+    for topic, msg, t in messages[half:]:
+        recorder.write(topic, msg, t, raw=True)
+    flush(recorder)
+    totals = follow(context, interval=0, iterations=1)
+
+    expected = BagSession(sample_bag, topics, use_cache=False).columns
+    for topic in topics:
+        for column, values in expected[topic].items():
+            np.testing.assert_array_equal(context.bag_session.columns[topic][column], values)
+
+    reference = RunningTotals(context.datum, context.json_map)
+    reference.update(expected)
+    assert totals.fix_count == reference.fix_count
+    assert totals.total_distance == pytest.approx(reference.total_distance)
+    assert totals.mode_time == pytest.approx(reference.mode_time)
+    assert totals.payload_time == pytest.approx(reference.payload_time)
+
+    # The recorder closes the bag and drops the .active suffix; nothing new turns up after that
+    recorder.close()
+    os.rename(active_path, str(tmp_path / 'run.bag'))
+    new_columns = context.bag_session.refresh()
+    assert not any(len(columns['t']) for columns in new_columns.values())
@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('rosbag')
+from topic_subscriber import BagSession, JSONProcessor
+from data_processor import RunningTotals
+from live_subscriber import LiveSubscriber, BagReplayPublisher
+
+def test_replay_matches_batch_totals(sample_bag, sample_map):
+    subscriber = BagReplayPublisher(sample_bag).run(LiveSubscriber(sample_map))
+
+    # Message by message, the totals come out as for the whole bag in one batch
+    columns = BagSession(sample_bag, subscriber.topics, use_cache=False).columns
+    json_map = JSONProcessor(sample_map)
+    reference = RunningTotals(json_map.datum, json_map)
+    reference.update(columns)
+    reference.finish()
+
+    assert subscriber.totals.fix_count == reference.fix_count
+    assert subscriber.totals.plc_row_count == reference.plc_row_count
+    summary = reference.summary()
+    for key, value in subscriber.totals.summary().items():
+        assert value == pytest.approx(summary[key]), key
+
+    # The ring buffers hold the same columns the bag session decoded
+    for topic in subscriber.topics:
+        for column, values in columns[topic].items():
+            np.testing.assert_array_equal(subscriber.buffered_columns(topic)[column], values)
@@ -0,0 +1,38 @@
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip('rosbag')
+from topic_subscriber import BagSession, TopicCache
+
+gps_topic = '/tric_navigation/gps/head_data'
+
+def test_truncated_entry_is_decoded_and_replaced(tmp_path, sample_bag):
+    cache_dir = str(tmp_path / 'cache')
+    expected = BagSession(sample_bag, [gps_topic], cache_dir=cache_dir).columns[gps_topic]
+    entry = TopicCache(cache_dir).entry_path(sample_bag, gps_topic)
+
+    with open(os.path.join(entry, 'latitude.npy'), 'r+b') as column_file:
+        column_file.truncate(40)
+    assert TopicCache(cache_dir).load(sample_bag, gps_topic) is None
+
+    columns = BagSession(sample_bag, [gps_topic], cache_dir=cache_dir).columns[gps_topic]
+    np.testing.assert_array_equal(columns['latitude'], expected['latitude'])
+
+    # The broken entry was overwritten, so the next session reads it from the cache again
+    cached = TopicCache(cache_dir).load(sample_bag, gps_topic)
+    np.testing.assert_array_equal(cached['latitude'], expected['latitude'])
+
+def test_entry_follows_umask(tmp_path, sample_bag):
+    # Cache directories are shared between users, so entries must not stay 0700 like mkdtemp makes them
+    cache_dir = str(tmp_path / 'cache')
+    umask = os.umask(0o022)
+    try:
+        BagSession(sample_bag, [gps_topic], cache_dir=cache_dir)
+    finally:
+        os.umask(umask)
+    entry = TopicCache(cache_dir).entry_path(sample_bag, gps_topic)
+    assert os.stat(entry).st_mode & 0o777 == 0o755
+    for name in os.listdir(entry):
+        assert os.stat(os.path.join(entry, name)).st_mode & 0o777 == 0o644
@@ -0,0 +1,20 @@
+import pandas as pd
+import pytest
+
+pytest.importorskip('rosbag')
+from topic_subscriber import ProcessingContext
+from data_processor import collect_run, process_in_windows, gps_topic, joystick_topic, uvc_topic, plc_feedback_topic
+
+topics = [gps_topic, joystick_topic, uvc_topic, plc_feedback_topic]
+
+@pytest.mark.parametrize('window', [1.0, 7.5, 3600.0])
+def test_windows_match_summary(sample_bag, sample_map, window):
+    totals = process_in_windows(sample_bag, sample_map, window=window)
+    run = collect_run(ProcessingContext(sample_bag, sample_map, topics, use_cache=False))
+
+    # Every figure the totals cover agrees with the in-memory summary, whatever the window size
+    summary = totals.summary()
+    for key, value in summary.items():
+        assert value == pytest.approx(run['summary'][key]), key
+    pd.testing.assert_frame_equal(totals.plc_segments, run['segments'], check_dtype=False)
+    pd.testing.assert_frame_equal(totals.stops, run['stops'], check_dtype=False)
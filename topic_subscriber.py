@@ -1,114 +1,995 @@
 #!/Library/Frameworks/Python.framework/Versions/3.12/bin/python3
 
+import io
+import os
+import re
+import bz2
 import json
+import shutil
+import pickle
+import hashlib
+import struct
+import tempfile
+import functools
+from array import array
 import rosbag
+import genpy
+from genpy.dynamic import generate_dynamic
 import math
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-from scipy.spatial import KDTree
+from scipy.spatial import cKDTree
+from cross_track import CrossTrackEngine
+
+class JSONStream:
+    # Incremental reader over a JSON file. Values are decoded one at a time from a sliding
+    # buffer, so large arrays can be walked element by element without loading the whole file.
+
+    chunk_size = 1 << 16
+    whitespace = re.compile(r'[ \t\n\r]*')
+
+    def __init__(self, json_file):
+        self.json_file = json_file
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        if self.eof:
+            return False
+        chunk = self.json_file.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        while True:
+            self.pos = self.whitespace.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer) or not self.fill():
+                return self.buffer[self.pos:self.pos + 1]
+
+    def expect(self, chars):
+        char = self.peek()
+        if not char or char not in chars:
+            raise ValueError(f"Invalid JSON structure. Expected one of {chars!r}, found {char!r}.")
+        self.pos += 1
+        return char
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                # The value continues in the next chunk
+                if not self.fill():
+                    raise
+                continue
+            # A number ending exactly at the buffer end may still continue in the next chunk
+            if end == len(self.buffer) and self.fill():
+                continue
+            self.pos = end
+            return value
+
+    def read_object(self, array_handlers):
+        # Decodes the top-level object. Arrays under a key in array_handlers are streamed to
+        # that handler one element at a time; everything else is returned in a dict.
+        values = {}
+        self.expect('{')
+        if self.peek() == '}':
+            self.pos += 1
+            return values
+
+        while True:
+            key = self.value()
+            self.expect(':')
+            if key in array_handlers and self.peek() == '[':
+                self.pos += 1
+                values[key] = None
+                if self.peek() == ']':
+                    self.pos += 1
+                else:
+                    while True:
+                        array_handlers[key](self.value())
+                        if self.expect(',]') == ']':
+                            break
+            else:
+                values[key] = self.value()
+
+            if self.expect(',}') == '}':
+                return values
+
+# Keys of JSONProcessor.data and the map segment kind each one is built from
+MAP_SEGMENT_KINDS = {
+    'rows': 'row',
+    'turns': 'turn',
+    'start_path': 'start_path',
+    'end_path': 'end_path'
+}
 
 class JSONProcessor:
 
     def __init__(self, json_file_path):
-        with open(json_file_path, "r") as json_file:
-            self.json_data = json.load(json_file)
-
+        self.json_file_path = json_file_path
+        self._json_data = None
+        self._data = None
+        self._cumulative_distance = None
+        self._spatial_index = None
+        self._cross_track_engine = None
+        self.load_json_map()
         self.validate_json_structure()
-        self.data = self.extract_all()
+        self.segments = self.build_segment_index()
+
+    def load_json_map(self):
+        # One streaming pass that keeps only what the processors use, as compact arrays.
+        # Points and wing/boom positions are stored as one contiguous array per field.
+        x, y, treatment_area = array('d'), array('d'), array('b')
+        wing_x, wing_y, boom_pos, left_wing_pos, right_wing_pos = array('d'), array('d'), array('d'), array('d'), array('d')
+
+        def add_point(point):
+            x.append(point['head']['position']['x'])
+            y.append(point['head']['position']['y'])
+            treatment_area.append(bool(point.get('treatment_area', False)))
+
+        def add_wing_boom_position(point):
+            wing_x.append(point['point']['position']['x'])
+            wing_y.append(point['point']['position']['y'])
+            boom_pos.append(point['boom_position'])
+            left_wing_pos.append(point['left_wing_position'])
+            right_wing_pos.append(point['right_wing_position'])
+
+        with open(self.json_file_path, "r") as json_file:
+            values = JSONStream(json_file).read_object({'points': add_point, 'wing_boom_position': add_wing_boom_position})
+
+        self.keys = set(values)
+        self.header = values.get('header')
+        self.datum = values.get('datum')
+        self.points = {
+            'x': np.frombuffer(x, dtype=np.float64),
+            'y': np.frombuffer(y, dtype=np.float64),
+            'treatment_area': np.frombuffer(treatment_area, dtype=np.int8).astype(bool)
+        }
+        self.wing_boom_position = {
+            'x': np.frombuffer(wing_x, dtype=np.float64),
+            'y': np.frombuffer(wing_y, dtype=np.float64),
+            'boom_pos': np.frombuffer(boom_pos, dtype=np.float64),
+            'left_wing_pos': np.frombuffer(left_wing_pos, dtype=np.float64),
+            'right_wing_pos': np.frombuffer(right_wing_pos, dtype=np.float64)
+        }
+
+    @property
+    def json_data(self):
+        # The full parsed document, only loaded if something asks for it
+        if self._json_data is None:
+            with open(self.json_file_path, "r") as json_file:
+                self._json_data = json.load(json_file)
+        return self._json_data
+
+    @property
+    def data(self):
+        if self._data is None:
+            self._data = self.extract_all()
+        return self._data
 
     def validate_json_structure(self):
-        if 'points' not in self.json_data or 'datum' not in self.json_data:
+        if 'points' not in self.keys or 'datum' not in self.keys:
             raise ValueError("Invalid JSON structure. Missing 'points' or 'datum'.")
 
+    def build_segment_index(self):
+        # Splits the planned path into contiguous segments: rows inside the treatment area, turns
+        # between rows, and the start/end paths before the first and after the last row.
+        # 'stop' is exclusive, so a segment's points are the zero-copy views x[start:stop], y[start:stop].
+        treatment_area = self.points['treatment_area']
+        n = len(treatment_area)
+        treatment_area_indices = np.flatnonzero(treatment_area)
+
+        if not len(treatment_area_indices):
+            return pd.DataFrame({'kind': ['start_path', 'end_path'], 'start': [0, n], 'stop': [n, n], 'length': [n, 0]})
+
+        first_treatment_area_index = treatment_area_indices[0]
+        last_treatment_area_index = treatment_area_indices[-1]
+        change = np.flatnonzero(treatment_area[1:] != treatment_area[:-1]) + 1
+        starts = np.concatenate(([0], change))
+        stops = np.concatenate((change, [n]))
+
+        # The start path runs up to and including the first row point
+        segments = [('start_path', 0, first_treatment_area_index + 1)]
+        for start, stop in zip(starts.tolist(), stops.tolist()):
+            if treatment_area[start]:
+                segments.append(('row', start, stop))
+            elif first_treatment_area_index < start and stop <= last_treatment_area_index:
+                segments.append(('turn', start, stop))
+        segments.append(('end_path', last_treatment_area_index + 1, n))
+
+        segments = pd.DataFrame(segments, columns=['kind', 'start', 'stop'])
+        segments['length'] = segments['stop'] - segments['start']
+        return segments
+
+    @property
+    def cumulative_distance(self):
+        # Distance along the planned path from the first point to every point, computed once.
+        # A segment's length is then cumulative_distance[stop - 1] - cumulative_distance[start].
+        if self._cumulative_distance is None:
+            steps = np.hypot(np.diff(self.points['x']), np.diff(self.points['y']))
+            self._cumulative_distance = np.concatenate(([0.0], np.cumsum(steps)))
+        return self._cumulative_distance
+
+    def segment_distances(self):
+        # Path length of every segment in the segment table, measured only within the segment
+        starts = self.segments['start'].to_numpy()
+        stops = self.segments['stop'].to_numpy()
+        cumulative = self.cumulative_distance
+        distances = np.zeros(len(starts))
+        non_empty = stops > starts
+        distances[non_empty] = cumulative[stops[non_empty] - 1] - cumulative[starts[non_empty]]
+        return distances
+
+    def segment_slices(self, kind):
+        # (x, y) views into the point arrays for every segment of this kind
+        x, y = self.points['x'], self.points['y']
+        segments = self.segments[self.segments['kind'] == kind]
+        return [(x[start:stop], y[start:stop]) for start, stop in zip(segments['start'].tolist(), segments['stop'].tolist())]
+
+    def segment_arrays(self, kind):
+        # All points of this kind as two contiguous arrays, in path order
+        slices = self.segment_slices(kind)
+        if len(slices) == 1:
+            return slices[0]
+        if not slices:
+            return np.empty(0), np.empty(0)
+        return np.concatenate([x for x, y in slices]), np.concatenate([y for x, y in slices])
+
     def extract_all(self):
-        treatment_area_indices = [i for i, point in enumerate(self.json_data['points']) if point.get('treatment_area', False)]
-        first_treatment_area_index = next((i for i, point in enumerate(self.json_data['points']) if point.get('treatment_area', False)), None)
-        last_point_index = len(self.json_data['points']) - 1
-        last_treatment_area_index = next((i for i in range(last_point_index, -1, -1) if self.json_data['points'][i].get('treatment_area', False)), None)
-
-        data = {
-            'rows': [
-                {
-                    'x': (point['head']['position']['x']),
-                    'y': (point['head']['position']['y'])
-                }
-                for point in self.json_data['points'] if point.get('treatment_area', False)
-            ],
-            'turns': [
-                {
-                    'x': (point['head']['position']['x']),
-                    'y': (point['head']['position']['y'])
-                }
-                for i in range(1, len(treatment_area_indices))
-                for point in self.json_data['points'][treatment_area_indices[i - 1] + 1: treatment_area_indices[i]]
-            ],
-            'start_path': [
-                {
-                    'x': (point['head']['position']['x']),
-                    'y': (point['head']['position']['y'])
-                }
-                for point in self.json_data['points'][:first_treatment_area_index + 1]
-            ],
-            'end_path': [
-                {
-                    'x': (point['head']['position']['x']),
-                    'y': (point['head']['position']['y'])
-                }
-                for point in self.json_data['points'][last_treatment_area_index + 1:]
-            ],
-            'datum': [
-                {
-                    'x': 0,
-                    'y': 0
-                }
-            ],
-            'wing_boom_pos': [
-                {
-                    'x': (point['point']['position']['x']),
-                    'y': (point['point']['position']['y']),
-                    'boom_pos': point['boom_position'],
-                    'left_wing_pos': point['left_wing_position'],
-                    'right_wing_pos': point['right_wing_position']
-                }
-                for point in self.json_data['wing_boom_position']
-            ]
-        }
+        def point_dicts(kind):
+            x, y = self.segment_arrays(kind)
+            return [{'x': px, 'y': py} for px, py in zip(x.tolist(), y.tolist())]
+
+        wing_boom = self.wing_boom_position
+        data = {key: point_dicts(kind) for key, kind in MAP_SEGMENT_KINDS.items()}
+        data['datum'] = [
+            {
+                'x': 0,
+                'y': 0
+            }
+        ]
+        data['wing_boom_pos'] = [
+            {
+                'x': px,
+                'y': py,
+                'boom_pos': boom,
+                'left_wing_pos': left,
+                'right_wing_pos': right
+            }
+            for px, py, boom, left, right in zip(wing_boom['x'].tolist(), wing_boom['y'].tolist(), wing_boom['boom_pos'].tolist(),
+                                                 wing_boom['left_wing_pos'].tolist(), wing_boom['right_wing_pos'].tolist())
+        ]
 
         return data
     
     def create_points_dataframe(self):
-        data = {
-            'x': [],
-            'y': [],
-            'treatment_area': []
-        }
+        df = pd.DataFrame(self.points)
+        return df
 
-        for point in self.json_data['points']:
-            data['x'].append(point['head']['position']['x'])
-            data['y'].append(point['head']['position']['y'])
-            data['treatment_area'].append(point.get('treatment_area', False))
+    def spatial_index(self):
+        if self._spatial_index is None:
+            self._spatial_index = MapIndex.load_or_build(self)
+        return self._spatial_index
+
+    def cross_track_engine(self):
+        if self._cross_track_engine is None:
+            self._cross_track_engine = CrossTrackEngine(self.points['x'], self.points['y'])
+        return self._cross_track_engine
+
+def default_mode(directory=False):
+    # Mode open()/makedirs() would create with under the current umask. mkstemp and mkdtemp always
+    # use 0600/0700, so files published from them are chmod-ed to this to stay readable by others.
+    umask = os.umask(0)
+    os.umask(umask)
+    return (0o777 if directory else 0o666) & ~umask
+
+class MapIndex:
+    # Nearest-neighbour trees over a map's wing/boom positions and path points.
+    # Built once per map file and pickled next to it as <map>.index.pkl, keyed on the map's
+    # size and mtime; a copy is also kept per process so every bag in a batch reuses it.
+
+    loaded = {}
+
+    def __init__(self, key, wing_boom_tree, points_tree):
+        self.key = key
+        self.wing_boom_tree = wing_boom_tree
+        self.points_tree = points_tree
+
+    @staticmethod
+    def map_key(json_file_path):
+        stat = os.stat(json_file_path)
+        return (CACHE_VERSION, os.path.abspath(json_file_path), stat.st_size, stat.st_mtime_ns)
+
+    @classmethod
+    def load_or_build(cls, json_processor):
+        key = cls.map_key(json_processor.json_file_path)
+        if key in cls.loaded:
+            return cls.loaded[key]
+
+        index_path = json_processor.json_file_path + '.index.pkl'
+        map_index = None
+        if os.path.exists(index_path):
+            try:
+                with open(index_path, 'rb') as index_file:
+                    map_index = pickle.load(index_file)
+            except Exception:
+                # An unreadable or outdated index file is simply rebuilt
+                map_index = None
+            if map_index is not None and map_index.key != key:
+                map_index = None
+
+        if map_index is None:
+            wing_boom = json_processor.wing_boom_position
+            points = json_processor.points
+            map_index = cls(key,
+                            cKDTree(np.column_stack((wing_boom['x'], wing_boom['y']))),
+                            cKDTree(np.column_stack((points['x'], points['y']))))
+            map_index.save(index_path)
+
+        cls.loaded[key] = map_index
+        return map_index
+
+    def save(self, index_path):
+        # Written to a temp file and renamed so other processes never read half an index;
+        # a map directory that is not writable just means the index is rebuilt next time
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(index_path)))
+        except OSError:
+            return
+        try:
+            with os.fdopen(fd, 'wb') as index_file:
+                pickle.dump(self, index_file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.chmod(tmp_path, default_mode())
+            os.replace(tmp_path, index_path)
+        except OSError:
+            os.remove(tmp_path)
+
+# Columns kept for each topic: (column name, dtype, function reading the value from a message).
+# Every topic also gets a 't' column holding the bag receive time in nanoseconds.
+TOPIC_COLUMNS = {
+    '/tric_navigation/gps/head_data': [
+        ('stamp', 'int64', lambda msg: msg.header.stamp.to_nsec()),
+        ('latitude', 'float64', lambda msg: msg.latitude),
+        ('longitude', 'float64', lambda msg: msg.longitude),
+    ],
+    '/tric_navigation/joystick_control': [
+        ('data', 'bool', lambda msg: msg.data),
+    ],
+    '/tric_navigation/uvc_light_status': [
+        ('data', 'str', lambda msg: msg.data),
+    ],
+    '/tric_navigation/plc_feedback': [
+        ('boom_position', 'float64', lambda msg: msg.boom_position),
+        ('left_wing_position', 'float64', lambda msg: msg.left_wing_position),
+        ('right_wing_position', 'float64', lambda msg: msg.right_wing_position),
+    ],
+}
+
+DEFAULT_TOPICS = list(TOPIC_COLUMNS)
+
+def decode_navsatfix(buffers):
+    # sensor_msgs/NavSatFix: header (uint32 seq, uint32 secs, uint32 nsecs, string frame_id),
+    # status (int8 status, uint16 service), then float64 latitude, longitude, altitude,
+    # float64[9] covariance and uint8 covariance type. The frame_id length fixes every later
+    # offset, so all messages of one size are decoded with a single frombuffer call.
+    count = len(buffers)
+    lengths = np.fromiter(map(len, buffers), dtype=np.int64, count=count)
+    columns = {'stamp': np.empty(count, dtype=np.int64), 'latitude': np.empty(count), 'longitude': np.empty(count)}
+
+    for length in np.unique(lengths):
+        frame_id_length = int(length) - 116
+        if frame_id_length < 0:
+            raise ValueError(f"NavSatFix message of {length} bytes is too short")
+        dtype = np.dtype({
+            'names': ['secs', 'nsecs', 'frame_id_length', 'latitude', 'longitude'],
+            'formats': ['<u4', '<u4', '<u4', '<f8', '<f8'],
+            'offsets': [4, 8, 12, 19 + frame_id_length, 27 + frame_id_length],
+            'itemsize': int(length)
+        })
+        index = np.flatnonzero(lengths == length)
+        records = np.frombuffer(b''.join([buffers[i] for i in index]), dtype=dtype)
+        if (records['frame_id_length'] != frame_id_length).any():
+            raise ValueError("NavSatFix frame_id length does not match the message size")
+        columns['stamp'][index] = records['secs'].astype(np.int64) * 10**9 + records['nsecs']
+        columns['latitude'][index] = records['latitude']
+        columns['longitude'][index] = records['longitude']
+    return columns
+
+def decode_plc_feedback(buffers):
+    # tric_navigation/PLC_Feedback: five float64 fields, 40 bytes per message
+    data = b''.join(buffers)
+    if len(data) != 40 * len(buffers):
+        raise ValueError("PLC_Feedback messages are not 40 bytes each")
+    records = np.frombuffer(data, dtype=np.dtype([
+        ('steering_angle', '<f8'), ('left_wing_position', '<f8'), ('right_wing_position', '<f8'),
+        ('boom_position', '<f8'), ('linear_velocity', '<f8')
+    ]))
+    return {name: records[name].copy() for name in records.dtype.names}
+
+# Fast-path decoders for the hot topics, keyed by message type and md5sum so that a changed
+# message definition falls back to full deserialization instead of reading the wrong offsets
+RAW_DECODERS = {
+    ('sensor_msgs/NavSatFix', '2d3a8cd499b9b4a0249fb98fd05cfa48'): decode_navsatfix,
+    ('tric_navigation/PLC_Feedback', '2cc29dd3c1567280c7f2ba4095115958'): decode_plc_feedback,
+}
+
+CACHE_VERSION = 1
+
+class TopicCache:
+    # On-disk cache of decoded topics, one directory of .npy column files per topic.
+    # Entries are keyed on bag path, size and mtime so a rewritten bag is decoded again.
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+
+    def entry_path(self, bag_path, topic):
+        stat = os.stat(bag_path)
+        key = f"{CACHE_VERSION}|{os.path.abspath(bag_path)}|{stat.st_size}|{stat.st_mtime_ns}|{topic}"
+        digest = hashlib.sha1(key.encode()).hexdigest()[:16]
+        return os.path.join(self.cache_dir, topic.strip('/').replace('/', '_') + '-' + digest)
+
+    def load(self, bag_path, topic):
+        entry = self.entry_path(bag_path, topic)
+        meta_path = os.path.join(entry, 'meta.json')
+        if not os.path.exists(meta_path):
+            return None
+
+        try:
+            with open(meta_path, "r") as meta_file:
+                meta = json.load(meta_file)
+            # Columns are memory-mapped, so only the pages that are used get read
+            columns = {column: np.load(os.path.join(entry, column + '.npy'), mmap_mode='r') for column in meta['columns']}
+        except (OSError, ValueError, KeyError):
+            # A truncated or unreadable entry is decoded again and replaced by store()
+            return None
+        if len({len(values) for values in columns.values()}) > 1:
+            return None
+        return columns
+
+    def store(self, bag_path, topic, columns):
+        # A cache directory that is not writable (or a full disk) just means the bag is decoded again next time
+        entry = self.entry_path(bag_path, topic)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_entry = tempfile.mkdtemp(dir=self.cache_dir)
+        except OSError:
+            return
+
+        try:
+            for column, values in columns.items():
+                np.save(os.path.join(tmp_entry, column + '.npy'), values)
+            with open(os.path.join(tmp_entry, 'meta.json'), "w") as meta_file:
+                json.dump({'topic': topic, 'columns': list(columns)}, meta_file)
+            os.chmod(tmp_entry, default_mode(directory=True))
+
+            # Publish the entry in one step so concurrent readers never see a partial one
+            try:
+                os.rename(tmp_entry, entry)
+            except OSError:
+                # A broken entry is in the way (load() gave up on it): replace it
+                shutil.rmtree(entry, ignore_errors=True)
+                os.rename(tmp_entry, entry)
+        except OSError:
+            shutil.rmtree(tmp_entry, ignore_errors=True)
+
+class ActiveBag:
+    # Reader for a bag that is still being recorded (.bag.active). rosbag needs the index, which the
+    # recorder only writes when it closes the bag, so this walks the chunk records already flushed to
+    # disk instead. The parsed file offset and the time range of every chunk are kept, so later reads
+    # only parse what was appended since. Offers the parts of rosbag.Bag that BagSession uses.
+
+    op_message = 0x02
+    op_bag_header = 0x03
+    op_chunk = 0x05
+    op_connection = 0x07
+
+    def __init__(self, bag_path):
+        self.bag_path = bag_path
+        self.offset = None          # file position of the first record not parsed yet
+        self.chunks = []            # (file position, first and last receive time in ns) per chunk
+        self.connections = {}       # conn id -> (topic, datatype, md5sum, pytype)
+        self.scan()
+
+    def current_path(self):
+        # rosbag record renames <name>.bag.active to <name>.bag when it stops; the records stay where they were
+        if not os.path.exists(self.bag_path) and self.bag_path.endswith('.active') and os.path.exists(self.bag_path[:-len('.active')]):
+            self.bag_path = self.bag_path[:-len('.active')]
+        return self.bag_path
+
+    @staticmethod
+    def parse_header(header):
+        fields = {}
+        pos = 0
+        while pos + 4 <= len(header):
+            length, = struct.unpack_from('<I', header, pos)
+            name, _, value = header[pos + 4:pos + 4 + length].partition(b'=')
+            fields[name.decode()] = value
+            pos += 4 + length
+        return fields
+
+    def read_record(self, bag_file):
+        # Header fields and data of the record at the current position,
+        # or None (position unchanged) if the recorder has not written all of it yet
+        start = bag_file.tell()
+        prefix = bag_file.read(4)
+        if len(prefix) == 4:
+            header = bag_file.read(struct.unpack('<I', prefix)[0])
+            size = bag_file.read(4)
+            if len(size) == 4:
+                data = bag_file.read(struct.unpack('<I', size)[0])
+                if len(data) == struct.unpack('<I', size)[0]:
+                    return self.parse_header(header), data
+        bag_file.seek(start)
+        return None
+
+    def chunk_records(self, fields, data):
+        compression = fields['compression'].decode()
+        if compression == 'bz2':
+            data = bz2.decompress(data)
+        elif compression == 'lz4':
+            # Part of ROS, like rosbag itself
+            import roslz4
+            data = roslz4.decompress(data)
+        elif compression != 'none':
+            raise rosbag.ROSBagException(f"Unsupported chunk compression: {compression}")
+
+        chunk = io.BytesIO(data)
+        while (record := self.read_record(chunk)) is not None:
+            yield record
+
+    def add_connection(self, fields, data):
+        conn = struct.unpack('<I', fields['conn'])[0]
+        if conn in self.connections:
+            return
+        info = self.parse_header(data)
+        datatype = info['type'].decode()
+        pytype = generate_dynamic(datatype, info['message_definition'].decode())[datatype]
+        self.connections[conn] = (fields['topic'].decode(), datatype, info['md5sum'].decode(), pytype)
+
+    def chunk_messages(self, fields, data):
+        # (conn id, receive time in ns, serialized message) of every message in one chunk
+        for record_fields, record_data in self.chunk_records(fields, data):
+            op = record_fields['op'][0]
+            if op == self.op_connection:
+                self.add_connection(record_fields, record_data)
+            elif op == self.op_message:
+                secs, nsecs = struct.unpack('<II', record_fields['time'])
+                yield struct.unpack('<I', record_fields['conn'])[0], secs * 10**9 + nsecs, record_data
+
+    def scan(self):
+        # Parses the chunks written since the last scan; a half-written record is left for the next one
+        with open(self.current_path(), 'rb') as bag_file:
+            if self.offset is None:
+                version = bag_file.readline()
+                if not version.endswith(b'\n'):
+                    return
+                if version != b'#ROSBAG V2.0\n':
+                    raise rosbag.ROSBagFormatException(f"Unsupported bag version: {version!r}")
+                record = self.read_record(bag_file)
+                if record is None:
+                    return
+                if record[0]['op'][0] != self.op_bag_header:
+                    raise rosbag.ROSBagFormatException("Expected a bag header record")
+                self.offset = bag_file.tell()
+
+            bag_file.seek(self.offset)
+            while (record := self.read_record(bag_file)) is not None:
+                fields, data = record
+                op = fields['op'][0]
+                if op == self.op_chunk:
+                    times = [t for conn, t, message in self.chunk_messages(fields, data)]
+                    if times:
+                        self.chunks.append((self.offset, min(times), max(times)))
+                elif op == self.op_connection:
+                    self.add_connection(fields, data)
+                self.offset = bag_file.tell()
+
+    def get_start_time(self):
+        self.scan()
+        if not self.chunks:
+            raise rosbag.ROSBagException("Bag contains no message")
+        return min(chunk[1] for chunk in self.chunks) / 1e9
+
+    def get_end_time(self):
+        self.scan()
+        if not self.chunks:
+            raise rosbag.ROSBagException("Bag contains no message")
+        return max(chunk[2] for chunk in self.chunks) / 1e9
+
+    def read_messages(self, topics=None, start_time=None, end_time=None, raw=False):
+        self.scan()
+        start = start_time.to_nsec() if start_time is not None else None
+        end = end_time.to_nsec() if end_time is not None else None
+
+        with open(self.current_path(), 'rb') as bag_file:
+            for position, first, last in list(self.chunks):
+                # Chunks outside the time range are not even decompressed
+                if (start is not None and last < start) or (end is not None and first > end):
+                    continue
+                bag_file.seek(position)
+                fields, data = self.read_record(bag_file)
+                for conn, t, message in self.chunk_messages(fields, data):
+                    topic, datatype, md5sum, pytype = self.connections[conn]
+                    if (topics is not None and topic not in topics) or (start is not None and t < start) or (end is not None and t > end):
+                        continue
+                    if raw:
+                        message = (datatype, message, md5sum, position, pytype)
+                    else:
+                        msg = pytype()
+                        msg.deserialize(message)
+                        message = msg
+                    yield topic, message, genpy.Time(t // 10**9, t % 10**9)
+
+    def close(self):
+        # Files are only open while reading; the parsed chunks are kept for the next read
+        pass
+
+class BagSession:
+    # Reads every requested topic from the bag in a single pass and shares the
+    # decoded columns with all processors built on top of it
+
+    def __init__(self, bag_path, topics, cache_dir=None, use_cache=True):
+        self.bag_path = bag_path
+        self.topics = list(topics)
+        self.columns = {}
+        # Bumped whenever new data is loaded, so cached results built on older data are rebuilt
+        self.version = 0
+        # Set once the bag turns out to be still recording; keeps its parsed chunks between reads
+        self.active_bag = None
+        if cache_dir is None:
+            cache_dir = os.path.join(os.path.dirname(os.path.abspath(bag_path)), '.topic_cache')
+        self.cache = TopicCache(cache_dir) if use_cache else None
+        self.load_rosbag(self.topics)
+
+    def load_rosbag(self, topics):
+        missing = []
+        for topic in topics:
+            columns = self.cache.load(self.bag_path, topic) if self.cache else None
+            if columns is None:
+                missing.append(topic)
+            else:
+                self.columns[topic] = columns
+                self.version += 1
+
+        if not missing:
+            return
+
+        unknown = [topic for topic in missing if topic not in TOPIC_COLUMNS]
+        if unknown:
+            raise ValueError(f"No column layout defined for topics: {unknown}")
+
+        decoded = self.read_columns(missing)
+
+        for topic in missing:
+            columns = decoded[topic]
+            # A bag still being recorded keeps growing, so there is nothing stable to cache yet
+            if self.cache and self.active_bag is None:
+                self.cache.store(self.bag_path, topic, columns)
+            self.columns[topic] = columns
+            self.version += 1
+
+    def open_bag(self):
+        if self.active_bag is not None:
+            return self.active_bag
+        try:
+            return rosbag.Bag(self.bag_path)
+        except rosbag.ROSBagUnindexedException:
+            self.active_bag = ActiveBag(self.bag_path)
+            return self.active_bag
+
+    def read_columns(self, topics, start_time=None, end_time=None, bag=None):
+        # One pass over the bag, decoding `topics` into column arrays (optionally limited to a time range).
+        # An already open bag can be passed in to avoid re-reading its index.
+        # Messages are read raw: hot topics with a known layout are decoded straight from their bytes,
+        # everything else is deserialized into a message object as usual.
+        opened = bag is None
+        if opened:
+            bag = self.open_bag()
+        values = {topic: {column: [] for column in ['t'] + [c[0] for c in TOPIC_COLUMNS[topic]]} for topic in topics}
+        raw = {}
+
+        for topic, (datatype, data, md5sum, position, pytype), t in bag.read_messages(topics=topics, start_time=start_time, end_time=end_time, raw=True):
+            decoder = RAW_DECODERS.get((datatype, md5sum))
+            entry = raw.get(topic)
+            if decoder is not None and (entry is None or entry['decoder'] is decoder):
+                if entry is None:
+                    entry = raw[topic] = {'decoder': decoder, 'pytype': pytype, 't': [], 'data': []}
+                entry['t'].append(t.to_nsec())
+                entry['data'].append(data)
+                continue
+
+            msg = pytype()
+            msg.deserialize(data)
+            topic_values = values[topic]
+            topic_values['t'].append(t.to_nsec())
+            for column, dtype, getter in TOPIC_COLUMNS[topic]:
+                topic_values[column].append(getter(msg))
+
+        if opened:
+            bag.close()
+
+        decoded = {}
+        for topic in topics:
+            dtypes = dict(t='int64', **{c[0]: c[1] for c in TOPIC_COLUMNS[topic]})
+            columns = {column: np.asarray(column_values, dtype=dtypes[column]) for column, column_values in values[topic].items()}
+            if topic in raw:
+                columns = self.merge_raw(topic, columns, raw[topic], dtypes)
+            decoded[topic] = columns
+        return decoded
+
+    def merge_raw(self, topic, columns, entry, dtypes):
+        # Adds the fast-path messages of one topic to the ones decoded the generic way
+        names = [c[0] for c in TOPIC_COLUMNS[topic]]
+        try:
+            fast = entry['decoder'](entry['data'])
+            fast = {column: np.asarray(fast[column], dtype=dtypes[column]) for column in names}
+        except (ValueError, KeyError):
+            # Unexpected layout: deserialize these messages fully after all
+            messages = []
+            for data in entry['data']:
+                msg = entry['pytype']()
+                msg.deserialize(data)
+                messages.append(msg)
+            fast = {column: np.asarray([getter(msg) for msg in messages], dtype=dtype) for column, dtype, getter in TOPIC_COLUMNS[topic]}
+        fast['t'] = np.asarray(entry['t'], dtype=np.int64)
+
+        if not len(columns['t']):
+            return {column: fast[column] for column in columns}
+        # Both paths were used for this topic, so put the rows back in receive order
+        order = np.argsort(np.concatenate((columns['t'], fast['t'])), kind='stable')
+        return {column: np.concatenate((columns[column], fast[column]))[order] for column in columns}
+
+    def read_windows(self, topics, window=60.0):
+        # Decodes the bag in bounded windows of `window` seconds and yields each window's columns,
+        # so memory stays flat however long the bag is. Nothing is kept in self.columns.
+        unknown = [topic for topic in topics if topic not in TOPIC_COLUMNS]
+        if unknown:
+            raise ValueError(f"No column layout defined for topics: {unknown}")
+
+        bag = self.open_bag()
+        try:
+            # The float start and end times of the bag lose nanoseconds, so they only place the
+            # window edges: the first window is open at the start and the last one at the end
+            start = int(bag.get_start_time() * 1e9)
+            end = int(math.ceil(bag.get_end_time() * 1e9))
+            step = max(int(window * 1e9), 1)
+
+            window_start = None
+            window_end = start + step
+            while True:
+                last = window_end >= end
+                decoded = self.read_columns(topics,
+                                            genpy.Time(window_start // 10**9, window_start % 10**9) if window_start is not None else None,
+                                            genpy.Time(window_end // 10**9, window_end % 10**9) if not last else None, bag)
+                if window_start is not None:
+                    # Both ends of a window are inclusive, so drop what the previous window returned
+                    for topic, columns in decoded.items():
+                        keep = columns['t'] > window_start
+                        decoded[topic] = {column: values[keep] for column, values in columns.items()}
+                yield decoded
+                if last:
+                    break
+                window_start, window_end = window_end, window_end + step
+        finally:
+            bag.close()
+
+    @property
+    def cursor(self):
+        # Receive time (ns) of the newest message loaded so far, or None before anything is loaded
+        last = [columns['t'][-1] for columns in self.columns.values() if len(columns['t'])]
+        return int(max(last)) if last else None
+
+    def refresh(self):
+        # Tailing mode for bags that are still being recorded: only messages received after the
+        # cursor are decoded and appended. Returns just the new columns per topic. Such a bag has
+        # no index yet, so it is read through ActiveBag, which only parses the chunks flushed since.
+        cursor = self.cursor
+        topics = list(self.columns)
+        if not topics:
+            return {}
+
+        start_time = genpy.Time(cursor // 10**9, cursor % 10**9) if cursor is not None else None
+        decoded = self.read_columns(topics, start_time=start_time)
+
+        new_columns = {}
+        for topic, columns in decoded.items():
+            if cursor is not None:
+                # read_messages includes start_time itself, which was already loaded
+                keep = columns['t'] > cursor
+                columns = {column: values[keep] for column, values in columns.items()}
+            new_columns[topic] = columns
+            if len(columns['t']):
+                current = self.columns[topic]
+                self.columns[topic] = {column: np.concatenate((current[column], values)) for column, values in columns.items()}
+
+        if any(len(columns['t']) for columns in new_columns.values()):
+            self.version += 1
+        return new_columns
+
+    def get_columns(self, topics):
+        # Topics that were not requested up front are read together in one extra pass
+        missing = [topic for topic in topics if topic not in self.columns]
+        if missing:
+            self.topics.extend(missing)
+            self.load_rosbag(missing)
+
+        return {topic: self.columns[topic] for topic in topics}
+
+class ProcessingContext:
+    # Everything one analysis run works on: a bag, its JSON map and the map datum.
+    # Nothing is read until first used, so a context is cheap to create and to send to a worker.
+
+    def __init__(self, bag_path, json_file_path, topics=None, cache_dir=None, use_cache=True):
+        self.bag_path = bag_path
+        self.json_file_path = json_file_path
+        self.topics = list(topics) if topics is not None else list(DEFAULT_TOPICS)
+        self.cache_dir = cache_dir
+        self.use_cache = use_cache
+        self._json_map = None
+        self._bag_session = None
+        self._processors = {}
+
+    @property
+    def json_map(self):
+        if self._json_map is None:
+            self._json_map = JSONProcessor(self.json_file_path)
+        return self._json_map
+
+    @property
+    def bag_session(self):
+        if self._bag_session is None:
+            self._bag_session = BagSession(self.bag_path, self.topics, self.cache_dir, self.use_cache)
+        return self._bag_session
+
+    @property
+    def datum(self):
+        return self.json_map.datum
+
+    def get_processor(self, processor_class, topics):
+        # One shared processor per class and topics, so their cached tables are shared between loggers
+        key = (processor_class, tuple(topics))
+        if key not in self._processors:
+            self._processors[key] = processor_class(self, topics)
+        return self._processors[key]
+
+    @property
+    def gps_processor(self):
+        return self.get_processor(GPSDataProcessor, ['/tric_navigation/gps/head_data'])
+
+    @property
+    def timeline(self):
+        # Built over every topic the session has loaded, including ones added by processors later
+        return self.get_processor(FusedTimeline, self.bag_session.topics)
+
+def cached_result(method):
+    # Memoizes a processor method's result until the bag session loads new data.
+    # The returned DataFrame is shared between all callers and must not be modified in place.
+    @functools.wraps(method)
+    def wrapper(self):
+        cache = self.__dict__.setdefault('_cached_results', {})
+        version = self.bag_session.version
+        entry = cache.get(method.__name__)
+        if entry is None or entry[0] != version:
+            entry = (version, method(self))
+            cache[method.__name__] = entry
+        return entry[1]
+    return wrapper
+
+def relative_seconds(t):
+    # Convert int64 nanosecond receive times to float seconds since the first one
+    t = np.asarray(t, dtype=np.int64)
+    return (t - t[0]) / 1e9 if len(t) else np.empty(0)
+
+def align_nearest(left_t, right_t):
+    # For every time in left_t, the index of the nearest time in right_t.
+    # Both arrays are int64 nanoseconds sorted ascending; ties go to the earlier sample.
+    left_t = np.asarray(left_t, dtype=np.int64)
+    right_t = np.asarray(right_t, dtype=np.int64)
+    if len(right_t) == 0:
+        raise ValueError("Cannot align against an empty time series.")
+
+    if len(right_t) == 1:
+        return np.zeros(len(left_t), dtype=np.intp)
+
+    after = np.searchsorted(right_t, left_t, side='left').clip(1, len(right_t) - 1)
+    before = after - 1
+    use_before = (left_t - right_t[before]) <= (right_t[after] - left_t)
+    return np.where(use_before, before, after)
+
+# Fused timeline column names, where they differ from the topic's own column name
+FUSED_COLUMN_NAMES = {
+    ('/tric_navigation/joystick_control', 'data'): 'joystick_control',
+    ('/tric_navigation/uvc_light_status', 'data'): 'uvc_light_status',
+}
+
+class FusedTimeline:
+    # Every message of every topic on one shared time base: one row per message in receive order,
+    # with its source topic, its index within that topic's columns and the nearest GPS position.
+    # Processors take their per-topic views from this one table instead of each merging against GPS;
+    # the stream values themselves stay in the session columns, so they are only held once.
+
+    def __init__(self, context, topics):
+        self.context = context
+        self.bag_path = context.bag_path
+        self.topics = list(topics)
+        self.bag_session = context.bag_session
+        self.load_rosbag()
 
-        df = pd.DataFrame(data)
-        return df
+    def load_rosbag(self):
+        return self.bag_session.get_columns(self.topics)
+
+    @property
+    def columns(self):
+        return self.bag_session.get_columns(self.topics)
+
+    def stream_columns(self, topic):
+        return [FUSED_COLUMN_NAMES.get((topic, c[0]), c[0]) for c in TOPIC_COLUMNS[topic]]
+
+    @cached_result
+    def create_table(self):
+        columns = self.columns
+
+        # k-way merge: each stream is already in receive order, so a stable sort of the
+        # concatenation only interleaves the runs, and equal times keep topic order
+        t = np.concatenate([columns[topic]['t'] for topic in self.topics])
+        source = np.concatenate([np.full(len(columns[topic]['t']), code, dtype=np.int8) for code, topic in enumerate(self.topics)])
+        row = np.concatenate([np.arange(len(columns[topic]['t'])) for topic in self.topics])
+        order = np.argsort(t, kind='stable')
+        t, source, row = t[order], source[order], row[order]
+
+        table = {'t': t, 'source': pd.Categorical.from_codes(source, categories=self.topics), 'row': row}
+
+        # GPS position nearest in time to every row
+        gps_df = self.context.gps_processor.create_dataframe()
+        nearest = align_nearest(t, gps_df['t'].to_numpy())
+        table['x'] = gps_df['x'].to_numpy()[nearest]
+        table['y'] = gps_df['y'].to_numpy()[nearest]
+
+        return pd.DataFrame(table)
+
+    def stream_view(self, topic):
+        # The rows one topic contributed, laid out like the processor frames:
+        # its own columns, timestamp relative to its first message, t, x and y
+        table = self.create_table()
+        rows = np.flatnonzero(table['source'].cat.codes.to_numpy() == self.topics.index(topic))
+        stream_rows = table['row'].to_numpy()[rows]
+        t = table['t'].to_numpy()[rows]
+
+        columns = self.columns[topic]
+        view = {name: np.asarray(columns[column])[stream_rows] for (column, dtype, getter), name in zip(TOPIC_COLUMNS[topic], self.stream_columns(topic))}
+        view['timestamp'] = relative_seconds(t)
+        view['t'] = t
+        view['x'] = table['x'].to_numpy()[rows]
+        view['y'] = table['y'].to_numpy()[rows]
+        return pd.DataFrame(view)
 
 class GPSDataProcessor:
 
-    def __init__(self, bag_path, topics):
-        self.bag_path = bag_path
+    def __init__(self, context, topics):
+        self.context = context
+        self.bag_path = context.bag_path
         self.topics = topics
-        self.messages = self.load_rosbag()
+        self.bag_session = context.bag_session
+        self.load_rosbag()
 
     def load_rosbag(self):
-        bag = rosbag.Bag(self.bag_path)
-        messages = {topic: [] for topic in self.topics}
+        return self.bag_session.get_columns(self.topics)
 
-        for topic, msg, t in bag.read_messages(topics=self.topics):
-            messages[topic].append(msg)
+    @property
+    def columns(self):
+        # Read through the session so data appended by BagSession.refresh() is always seen
+        return self.bag_session.get_columns(self.topics)
 
-        bag.close()
-        return messages
-    
-    def gps_to_meters(self, lon1, lat1, lon2, lat2):
+    @staticmethod
+    def gps_to_meters(lon1, lat1, lon2, lat2):
         R = 6371  # radius of earth at equator (km)
         alpha1 = lat1  # alpha (deg)
         r1 = R * math.cos(math.pi * alpha1/180) 
@@ -127,70 +1008,66 @@ class GPSDataProcessor:
 
         return x_m, y_m
 
-    def create_dataframe(self):
-        data = {'x': [], 'y': [], 'timestamp': []}
+    @staticmethod
+    def gps_array_to_meters(lon1, lat1, longitudes, latitudes, stamps):
+        # Same projection as gps_to_meters, applied to whole arrays of fixes in one call.
+        # Also returns the header stamps (ns) as seconds since the first fix.
+        R = 6371  # radius of earth at equator (km)
+        r1 = R * math.cos(math.pi * lat1/180)
+        l1 = r1 * math.pi/180
+        L1 = R * math.pi/180
+
+        x_m = L1 * (np.asarray(latitudes, dtype=np.float64) - lat1) * 1000  # convert km to meters
+        y_m = l1 * (np.asarray(longitudes, dtype=np.float64) - lon1) * 1000
 
-        # Find the start time of the recording
-        start_time = pd.to_datetime(self.messages['/tric_navigation/gps/head_data'][0].header.stamp.to_sec(), unit='s')
+        stamps = np.asarray(stamps, dtype=np.int64)
+        timestamps = (stamps - stamps[0]) / 1e9 if len(stamps) else np.empty(0)
 
-        for gps_msg in self.messages['/tric_navigation/gps/head_data']:
-            # Convert the GPS coordinates to distances from the datum
-            x, y = self.gps_to_meters(json_map.json_data['datum']['longitude'], json_map.json_data['datum']['latitude'], gps_msg.longitude, gps_msg.latitude)
-            data['x'].append(x)
-            data['y'].append(y)
+        return x_m, y_m, timestamps
 
-            # Calculate timestamp relative to the recording start, rounded to seconds with 2 decimal places
-            timestamp_relative = pd.to_datetime(gps_msg.header.stamp.to_sec(), unit='s') - start_time
-            timestamp_seconds = timestamp_relative.total_seconds()
-            data['timestamp'].append(timestamp_seconds)
+    @cached_result
+    def create_dataframe(self):
+        gps_columns = self.columns['/tric_navigation/gps/head_data']
+        datum = self.context.datum
+
+        # Convert all GPS coordinates to distances from the datum, with timestamps relative to the recording start
+        x, y, timestamp = self.gps_array_to_meters(datum['longitude'], datum['latitude'], gps_columns['longitude'], gps_columns['latitude'], gps_columns['stamp'])
 
-        df = pd.DataFrame(data)
+        df = pd.DataFrame({'x': x, 'y': y, 'timestamp': timestamp, 't': gps_columns['t']})
         return df
         
 class JoystickDataProcessor:
-    def __init__(self, bag_path, topics):
-        self.bag_path = bag_path
+    def __init__(self, context, topics):
+        self.context = context
+        self.bag_path = context.bag_path
         self.topics = topics
-        self.messages = self.load_rosbag()
+        self.bag_session = context.bag_session
+        self.load_rosbag()
 
     def load_rosbag(self):
-        bag = rosbag.Bag(self.bag_path)
-        messages = {topic: [] for topic in self.topics}
-
-        for topic, msg, t in bag.read_messages(topics=self.topics):
-            messages[topic].append(msg)
-
-        bag.close()
-        return messages
-
-    def create_dataframe(self, assumed_frequency=12.3):
-        data = {'joystick_control': [], 'timestamp': []}
-
-        # Assuming messages are sorted by timestamp
-        time_since_start = 0  # Initialize time_since_start to 0
+        return self.bag_session.get_columns(self.topics)
 
-        for joystick_msg in self.messages['/tric_navigation/joystick_control']:
-            data['joystick_control'].append(joystick_msg.data)
+    @property
+    def columns(self):
+        # Read through the session so data appended by BagSession.refresh() is always seen
+        return self.bag_session.get_columns(self.topics)
 
-            # Calculate timestamp based on the assumed frequency, rounded to seconds with 2 decimal places
-            timestamp_seconds = time_since_start
-            data['timestamp'].append(timestamp_seconds)
-            time_since_start += 1 / assumed_frequency  # Increase time_since_start by the reciprocal of the assumed frequency
-
-        df = pd.DataFrame(data)
+    def create_dataframe(self):
+        joystick_columns = self.columns['/tric_navigation/joystick_control']
+
+        # Timestamps come from the bag receive times, relative to the first message
+        df = pd.DataFrame({
+            'joystick_control': joystick_columns['data'].astype(bool),
+            'timestamp': relative_seconds(joystick_columns['t']),
+            't': joystick_columns['t']
+        })
         return df
-    
-    def create_gps_dataframe(self):
-        gps_processor = GPSDataProcessor(self.bag_path, ['/tric_navigation/gps/head_data'])
-        gps_df = gps_processor.create_dataframe()
-        return gps_df
         
+    @cached_result
     def merge_dataframes(self):
 
-        gps_df = self.create_gps_dataframe()
-        joystick_df = self.create_dataframe()
-        # Merge dataframes
-        merged_df = pd.merge_asof(joystick_df, gps_df, on='timestamp', direction='nearest')
+        # Joystick samples with their nearest GPS position, from the shared fused timeline
+        merged_df = self.context.timeline.stream_view('/tric_navigation/joystick_control')
 
         # Calculate the differences in longitude (x) and latitude (y) between consecutive rows
         delta_x = merged_df['x'].diff()
@@ -208,49 +1085,43 @@ class JoystickDataProcessor:
         return merged_df
 
 class UVCLightDataProcessor:
-    def __init__(self, bag_path, topics):
-        self.bag_path = bag_path
+    def __init__(self, context, topics):
+        self.context = context
+        self.bag_path = context.bag_path
         self.topics = topics
-        self.messages = self.load_rosbag()
+        self.bag_session = context.bag_session
+        self.load_rosbag()
 
     def load_rosbag(self):
-        bag = rosbag.Bag(self.bag_path)
-        messages = {topic: [] for topic in self.topics}
-
-        for topic, msg, t in bag.read_messages(topics=self.topics):
-            messages[topic].append(msg)
-
-        bag.close()
-        return messages
+        return self.bag_session.get_columns(self.topics)
 
-    def create_dataframe(self, assumed_frequency=12.3):
-        data = {'uvc_light_status': [], 'timestamp': []}
+    @property
+    def columns(self):
+        # Read through the session so data appended by BagSession.refresh() is always seen
+        return self.bag_session.get_columns(self.topics)
 
-        # Assuming messages are sorted by timestamp
-        time_since_start = 0  # Initialize time_since_start to 0
-
-        for uvc_msg in self.messages['/tric_navigation/uvc_light_status']:
-            data['uvc_light_status'].append(uvc_msg.data)
-
-            # Calculate timestamp based on the assumed frequency, rounded to seconds with 2 decimal places
-            timestamp_seconds = time_since_start
-            data['timestamp'].append(timestamp_seconds)
-            time_since_start += 1 / assumed_frequency  # Increase time_since_start by the reciprocal of the assumed frequency
-
-        df = pd.DataFrame(data)
+    def create_dataframe(self):
+        uvc_columns = self.columns['/tric_navigation/uvc_light_status']
+
+        # Timestamps come from the bag receive times, relative to the first message
+        df = pd.DataFrame({
+            'uvc_light_status': uvc_columns['data'].astype(str),
+            'timestamp': relative_seconds(uvc_columns['t']),
+            't': uvc_columns['t']
+        })
         return df
-    
-    def create_gps_dataframe(self):
-        gps_processor = GPSDataProcessor(self.bag_path, ['/tric_navigation/gps/head_data'])
-        gps_df = gps_processor.create_dataframe()
-        return gps_df
         
+    @cached_result
+    def merge_gps(self):
+        # Every sample with its nearest GPS position, from the shared fused timeline.
+        # Stationary samples are kept so no time is lost.
+        return self.context.timeline.stream_view('/tric_navigation/uvc_light_status')
+
+    @cached_result
     def merge_dataframes(self):
 
-        gps_df = self.create_gps_dataframe()
-        uvc_df = self.create_dataframe()
         # Merge dataframes
-        merged_df = pd.merge_asof(uvc_df, gps_df, on='timestamp', direction='nearest')
+        merged_df = self.merge_gps()
 
         # Calculate the differences in longitude (x) and latitude (y) between consecutive rows
         delta_x = merged_df['x'].diff()
@@ -268,90 +1139,62 @@ class UVCLightDataProcessor:
         return merged_df
 
 class PLCFeedbackDataProcessor:
-    def __init__(self, bag_path, topics, json_data):
-        self.bag_path = bag_path
+    def __init__(self, context, topics):
+        self.context = context
+        self.bag_path = context.bag_path
         self.topics = topics
-        self.messages = self.load_rosbag()
-        self.json_data = json_data
+        self.bag_session = context.bag_session
+        self.load_rosbag()
+        self.json_data = context.json_map
 
     def load_rosbag(self):
-        bag = rosbag.Bag(self.bag_path)
-        messages = {topic: [] for topic in self.topics}
+        return self.bag_session.get_columns(self.topics)
 
-        for topic, msg, t in bag.read_messages(topics=self.topics):
-            messages[topic].append(msg)
+    @property
+    def columns(self):
+        # Read through the session so data appended by BagSession.refresh() is always seen
+        return self.bag_session.get_columns(self.topics)
 
-        bag.close()
-        return messages
-
-    def create_dataframe(self, assumed_frequency=10.6):
-        data = {'boom_position': [],'left_wing_position':[], 'right_wing_position':[] , 'timestamp': []}
-
-        # Assuming messages are sorted by timestamp
-        time_since_start = 0  # Initialize time_since_start to 0
-
-        for plc_msg in self.messages['/tric_navigation/plc_feedback']:
-            data['boom_position'].append(plc_msg.boom_position)
-            data['left_wing_position'].append(plc_msg.left_wing_position)
-            data['right_wing_position'].append(plc_msg.right_wing_position)
-
-            # Calculate timestamp based on the assumed frequency, rounded to seconds with 2 decimal places
-            timestamp_seconds = time_since_start
-            data['timestamp'].append(timestamp_seconds)
-            time_since_start += 1 / assumed_frequency  # Increase time_since_start by the reciprocal of the assumed frequency
-
-        df = pd.DataFrame(data)
+    def create_dataframe(self):
+        plc_columns = self.columns['/tric_navigation/plc_feedback']
+
+        # Timestamps come from the bag receive times, relative to the first message
+        df = pd.DataFrame({
+            'boom_position': plc_columns['boom_position'],
+            'left_wing_position': plc_columns['left_wing_position'],
+            'right_wing_position': plc_columns['right_wing_position'],
+            'timestamp': relative_seconds(plc_columns['t']),
+            't': plc_columns['t']
+        })
         return df
     
-    def create_gps_dataframe(self):
-        gps_processor = GPSDataProcessor(self.bag_path, ['/tric_navigation/gps/head_data'])
-        gps_df = gps_processor.create_dataframe()
-        return gps_df
-    
+    @cached_result
     def create_wing_boom_dataframe(self):
-        data = {
-            'x': [],
-            'y': [],
-            'boom_pos': [],
-            'left_wing_pos': [],
-            'right_wing_pos': []
-        }
-
-        json_data = self.json_data.data
-
-        for point in json_data['wing_boom_pos']:
-            data['x'].append(point['x'])
-            data['y'].append(point['y'])
-            data['boom_pos'].append(point['boom_pos'])
-            data['left_wing_pos'].append(point['left_wing_pos'])
-            data['right_wing_pos'].append(point['right_wing_pos'])
-
-        df = pd.DataFrame(data)
+        df = pd.DataFrame(self.json_data.wing_boom_position)
         return df
         
+    @cached_result
     def merge_dataframes(self):
-        gps_df = self.create_gps_dataframe()
-        plc_df = self.create_dataframe()
         wing_boom_df = self.create_wing_boom_dataframe()
-        points_df = json_map.create_points_dataframe()
+        points_df = self.json_data.create_points_dataframe()
+
+        # PLC feedback with the nearest GPS position, from the shared fused timeline
+        merged_df = self.context.timeline.stream_view('/tric_navigation/plc_feedback')
 
-        # Merge gps_df and plc_df
-        merged_df = pd.merge_asof(plc_df, gps_df, on='timestamp', direction='nearest')
+        # Nearest-neighbour trees are built once per map and shared across bags and processes
+        map_index = self.json_data.spatial_index()
+        positions = merged_df[['x', 'y']].to_numpy()
 
-        # Create a KDTree from wing_boom_df
-        tree_wing_boom = KDTree(wing_boom_df[['x', 'y']])
         # Find indices of the nearest points in wing_boom_df for each point in merged_df
-        _, indices_wing_boom = tree_wing_boom.query(merged_df[['x', 'y']])
+        _, indices_wing_boom = map_index.wing_boom_tree.query(positions, workers=-1)
         # Add columns from wing_boom_df to merged_df based on the indices
         for column in ['boom_pos', 'left_wing_pos', 'right_wing_pos']:
-            merged_df[column] = wing_boom_df[column].iloc[indices_wing_boom].values
+            merged_df[column] = wing_boom_df[column].to_numpy()[indices_wing_boom]
 
-        # Create a KDTree from points_df
-        tree_points = KDTree(points_df[['x', 'y']])
         # Find indices of the nearest points in points_df for each point in merged_df
-        _, indices_points = tree_points.query(merged_df[['x', 'y']])
+        _, indices_points = map_index.points_tree.query(positions, workers=-1)
         # Add 'treatment_area' column from points_df to merged_df based on the indices
-        merged_df['treatment_area'] = points_df['treatment_area'].iloc[indices_points].values
+        merged_df['treatment_area'] = points_df['treatment_area'].to_numpy()[indices_points]
 
         # Drop duplicate rows based on 'x' and 'y' columns
         merged_df = merged_df.drop_duplicates(subset=['x', 'y'])
@@ -359,10 +1202,3 @@ class PLCFeedbackDataProcessor:
 
         return merged_df
 
-
-json_map = JSONProcessor('json_maps/testrow.json')
-json_data = json_map.data
-gps_data = GPSDataProcessor('e0_rosbags/2023-12-06-15-32-37.bag', ['/tric_navigation/gps/head_data'])
-joystick_data = JoystickDataProcessor('e0_rosbags/2023-12-06-15-32-37.bag', ['/tric_navigation/joystick_control'])
-uvc_data = UVCLightDataProcessor('e0_rosbags/2023-12-06-15-32-37.bag', ['/tric_navigation/uvc_light_status']) 
-plc_data = PLCFeedbackDataProcessor('e0_rosbags/2023-12-06-15-32-37.bag', ['/tric_navigation/plc_feedback'], json_map)
\ No newline at end of file